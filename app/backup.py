@@ -0,0 +1,158 @@
+import asyncio
+import glob
+import gzip
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from typing import Optional
+
+from app import db
+from app.core.tenants import all_tenants, get_tenant, use_tenant
+
+logger = logging.getLogger(__name__)
+
+# Куда складывать снимки и сколько последних хранить
+BACKUP_DIR = os.getenv("BACKUP_DIR", "/data/backups")
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))
+# Как часто делать снимок (сек)
+BACKUP_INTERVAL = float(os.getenv("BACKUP_INTERVAL", str(24 * 60 * 60)))
+# Страниц за один шаг backup API и пауза между шагами (сек)
+BACKUP_STEP_PAGES = int(os.getenv("BACKUP_STEP_PAGES", "256"))
+BACKUP_STEP_PAUSE = float(os.getenv("BACKUP_STEP_PAUSE", "0.005"))
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _snapshot(src: sqlite3.Connection, backup_dir: str, prefix: str) -> dict:
+    """Снимок одной БД в <prefix>-<время>.db.gz с контрольной суммой рядом; закрывает src"""
+    started = time.perf_counter()
+    name = f"{prefix}-{datetime.utcnow():%Y%m%d-%H%M%S}.db.gz"
+    path = os.path.join(backup_dir, name)
+
+    with tempfile.TemporaryDirectory(dir=backup_dir) as tmp:
+        raw_path = os.path.join(tmp, "snapshot.db")
+        dst = sqlite3.connect(raw_path)
+        try:
+            # Открытая транзакция чтения фиксирует снимок: в WAL запись в БД при этом не блокируется,
+            # а backup не начинается заново после каждой записи бота
+            src.execute("BEGIN")
+            src.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            src.backup(dst, pages=BACKUP_STEP_PAGES, progress=lambda *_: time.sleep(BACKUP_STEP_PAUSE))
+            src.execute("COMMIT")
+        finally:
+            dst.close()
+            src.close()
+
+        with open(raw_path, "rb") as f_in, gzip.open(f"{path}.tmp", "wb", compresslevel=6) as f_out:
+            shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+
+    os.replace(f"{path}.tmp", path)
+    checksum = _sha256(path)
+    with open(f"{path}.sha256", "w", encoding="ascii") as f:
+        f.write(f"{checksum}  {name}\n")
+
+    _rotate(backup_dir, prefix)
+    result = {
+        "path": path,
+        "bytes": os.path.getsize(path),
+        "sha256": checksum,
+        "seconds": time.perf_counter() - started,
+    }
+    logger.info("Backup written: %s (%.1f MB, %.1fs)", path, result["bytes"] / 2**20, result["seconds"])
+    return result
+
+
+def create_backup(backup_dir: Optional[str] = None) -> dict:
+    """
+    Снимает копию БД через online backup API небольшими шагами, сжимает её
+    и пишет рядом контрольную сумму (<файл>.sha256). Архив неактивных пользователей —
+    отдельный файл, его снимок (если архив уже есть) — в result["archive"].
+    Вызывать в отдельном потоке.
+    """
+    tenant = get_tenant()
+    backup_dir = backup_dir or (tenant.backup_dir if tenant is not None and tenant.backup_dir else BACKUP_DIR)
+    os.makedirs(backup_dir, exist_ok=True)
+
+    result = _snapshot(db._connect(), backup_dir, "bot")
+    result["archive"] = None
+    archive_path = db.archive_db_path()
+    if os.path.exists(archive_path):
+        # Архив пишется редко (архивация и возврат пользователя), снимок держит его блокировку недолго
+        result["archive"] = _snapshot(sqlite3.connect(archive_path, timeout=5), backup_dir, "archive")
+    return result
+
+
+def _rotate(backup_dir: str, prefix: str = "bot", keep: int = BACKUP_KEEP) -> None:
+    """Удаляет старые снимки, оставляя keep последних"""
+    if keep <= 0:
+        return
+    snapshots = sorted(glob.glob(os.path.join(backup_dir, f"{prefix}-*.db.gz")))
+    for path in snapshots[:-keep]:
+        for stale in (path, f"{path}.sha256"):
+            if os.path.exists(stale):
+                os.remove(stale)
+
+
+def verify_backup(path: str, table: str = "users") -> dict:
+    """
+    Проверка восстановления: сверяет контрольную сумму, распаковывает снимок во временный файл,
+    выполняет PRAGMA integrity_check и читает версию схемы (у архива её нет) и число записей в table.
+    """
+    with open(f"{path}.sha256", encoding="ascii") as f:
+        expected = f.read().split()[0]
+    if _sha256(path) != expected:
+        return {"ok": False, "error": "checksum mismatch"}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        restored = os.path.join(tmp, "restored.db")
+        with gzip.open(path, "rb") as f_in, open(restored, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+        conn = sqlite3.connect(restored)
+        try:
+            integrity = conn.execute("PRAGMA integrity_check").fetchone()[0]
+            version = None
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'schema_version'").fetchone():
+                version = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0]
+            users = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        except sqlite3.DatabaseError as e:
+            return {"ok": False, "error": str(e)}
+        finally:
+            conn.close()
+
+    return {"ok": integrity == "ok", "integrity": integrity, "schema_version": version, "users": users}
+
+
+async def backup_and_verify() -> dict:
+    """Снимок и проверка восстановления, не блокируя цикл событий"""
+    result = await asyncio.to_thread(create_backup)
+    result["verify"] = await asyncio.to_thread(verify_backup, result["path"])
+    archive = result["archive"]
+    if archive is not None:
+        archive["verify"] = await asyncio.to_thread(verify_backup, archive["path"], "users_archive")
+    for snapshot in (result, archive):
+        if snapshot is not None and not snapshot["verify"]["ok"]:
+            logger.error("Backup verification failed for %s: %s", snapshot["path"], snapshot["verify"])
+    return result
+
+
+async def backup_loop(interval: float = BACKUP_INTERVAL) -> None:
+    """Фоновая задача: периодические резервные копии БД всех ботов"""
+    while True:
+        await asyncio.sleep(interval)
+        for tenant in all_tenants():
+            with use_tenant(tenant):
+                try:
+                    await backup_and_verify()
+                except Exception:
+                    logger.exception("Scheduled backup failed")
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import nullcontext, suppress
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update, User
+
+from app.core.tenants import tenant_name
+
+logger = logging.getLogger(__name__)
+
+# Сколько апдейтов (разных пользователей) обрабатываем одновременно
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "50"))
+# Окно, в котором повторное нажатие той же кнопки считается дублем (сек)
+DEDUP_WINDOW = float(os.getenv("DEDUP_WINDOW", "3"))
+
+
+class UserSerialMiddleware(BaseMiddleware):
+    """
+    Исполнитель апдейтов:
+    - апдейты одного пользователя выполняются строго по очереди (per-user lock);
+    - апдейты разных пользователей — параллельно, но не более max_concurrent одновременно
+      и не более лимита своего бота (TenantMiddleware.slot); оба места берутся уже после
+      очереди пользователя, поэтому ждущие своей очереди апдейты не занимают места других;
+    - повторное нажатие той же inline-кнопки на том же сообщении в пределах dedup_window отбрасывается.
+    Регистрируется как outer middleware на dp.update.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = MAX_CONCURRENT_UPDATES,
+        dedup_window: float = DEDUP_WINDOW,
+        max_dedup_keys: int = 10000,
+    ) -> None:
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._dedup_window = dedup_window
+        self._max_dedup_keys = max_dedup_keys
+        # (бот, user_id) -> [lock, сколько апдейтов держат/ждут lock]
+        self._locks: Dict[tuple, list] = {}
+        self._recent_callbacks: "OrderedDict[tuple, float]" = OrderedDict()
+        # Метрики
+        self.duplicates_dropped = 0
+        self.processed = 0
+        self.wait_max = 0.0
+        self._wait_total = 0.0
+        self._waits: deque = deque(maxlen=1000)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user: Optional[User] = data.get("event_from_user")
+        if user is None:
+            async with self._tenant_slot(data), self._semaphore:
+                return await handler(event, data)
+
+        if isinstance(event, Update) and event.callback_query and self._is_duplicate(event):
+            self.duplicates_dropped += 1
+            with suppress(Exception):
+                await event.callback_query.answer()
+            return None
+
+        queued_at = time.monotonic()
+        lock_key = (tenant_name(), user.id)
+        entry = self._locks.setdefault(lock_key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                # Сначала место бота, потом общее: бот, упёршийся в свой лимит, не держит общие места
+                async with self._tenant_slot(data), self._semaphore:
+                    self._record_wait(time.monotonic() - queued_at)
+                    return await handler(event, data)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._locks.pop(lock_key, None)
+
+    @staticmethod
+    def _tenant_slot(data: Dict[str, Any]):
+        tenancy = data.get("tenancy")
+        tenant = data.get("tenant")
+        if tenancy is None or tenant is None:
+            return nullcontext()
+        return tenancy.slot(tenant)
+
+    def _is_duplicate(self, update: Update) -> bool:
+        callback = update.callback_query
+        message_id = callback.message.message_id if callback.message else callback.inline_message_id
+        key = (tenant_name(), callback.from_user.id, message_id, callback.data)
+        now = time.monotonic()
+
+        seen_at = self._recent_callbacks.get(key)
+        if seen_at is not None and now - seen_at < self._dedup_window:
+            return True
+
+        self._recent_callbacks[key] = now
+        self._recent_callbacks.move_to_end(key)
+        # Чистим устаревшие ключи (они упорядочены по времени)
+        while self._recent_callbacks:
+            oldest_key, oldest_at = next(iter(self._recent_callbacks.items()))
+            if now - oldest_at < self._dedup_window and len(self._recent_callbacks) <= self._max_dedup_keys:
+                break
+            del self._recent_callbacks[oldest_key]
+        return False
+
+    def _record_wait(self, wait: float) -> None:
+        self.processed += 1
+        self._wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self._waits.append(wait)
+
+    def stats(self) -> dict:
+        """Метрики очереди: ожидание в очереди (среднее, p50/p95 по последним 1000, максимум)"""
+        waits = sorted(self._waits)
+
+        def percentile(p: float) -> float:
+            return waits[min(len(waits) - 1, int(len(waits) * p))] if waits else 0.0
+
+        return {
+            "processed": self.processed,
+            "duplicates_dropped": self.duplicates_dropped,
+            "users_queued": len(self._locks),
+            "wait_avg": self._wait_total / self.processed if self.processed else 0.0,
+            "wait_p50": percentile(0.5),
+            "wait_p95": percentile(0.95),
+            "wait_max": self.wait_max,
+        }
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from aiohttp import web
+
+from app.core.tasks import supervisor
+
+logger = logging.getLogger(__name__)
+
+# Адрес HTTP-проверки здоровья (/health — жив ли процесс, /ready — готов ли принимать пользователей).
+# HEALTH_PORT=0 — не поднимать
+HEALTH_HOST = os.getenv("HEALTH_HOST", "127.0.0.1")
+HEALTH_PORT = int(os.getenv("HEALTH_PORT", "8080"))
+# Как часто мерить задержку цикла событий (сек) и какая задержка считается зависанием
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "1"))
+HEALTH_MAX_LOOP_LAG = float(os.getenv("HEALTH_MAX_LOOP_LAG", "5"))
+# Сколько бот может не получать ответ на getUpdates (сек), прежде чем считаться мёртвым.
+# Long polling отвечает хотя бы раз в несколько секунд даже без апдейтов
+HEALTH_MAX_POLL_AGE = float(os.getenv("HEALTH_MAX_POLL_AGE", "120"))
+
+
+class HealthMonitor(BaseMiddleware):
+    """
+    Состояние процесса для проверки здоровья: прогрев, задержка цикла событий,
+    последний успешно обработанный апдейт и последний ответ getUpdates каждого бота,
+    глубина очередей и метрики компонентов. Как outer middleware на dp.update отмечает успешные апдейты.
+    """
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.warmed_up = False
+        # Результаты шагов прогрева: имя -> "ok" или текст ошибки
+        self.checks: dict[str, str] = {}
+        self.loop_lag = 0.0
+        self.loop_lag_max = 0.0
+        self.last_update: Optional[float] = None
+        self.updates_ok = 0
+        # Боты, чей polling проверяется: имя -> id, и откуда брать время последнего getUpdates
+        self.bots: dict[str, int] = {}
+        self.last_poll: dict[int, float] = {}
+        # Источники глубины очередей: имя -> функция без аргументов
+        self.queues: dict[str, Callable[[], Any]] = {}
+        # Источники метрик компонентов (время — в секундах): имя -> функция без аргументов
+        self.metrics: dict[str, Callable[[], Any]] = {}
+        self._runner: Optional[web.AppRunner] = None
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        result = await handler(event, data)
+        self.last_update = time.time()
+        self.updates_ok += 1
+        return result
+
+    def watch_polling(self, bots: dict[str, int], last_poll: dict[int, float]) -> None:
+        """bots — id бота по имени; last_poll — словарь сессии, который она обновляет на каждый getUpdates"""
+        self.bots = dict(bots)
+        self.last_poll = last_poll
+
+    def add_queue(self, name: str, depth: Callable[[], Any]) -> None:
+        self.queues[name] = depth
+
+    def add_metrics(self, name: str, source: Callable[[], Any]) -> None:
+        self.metrics[name] = source
+
+    def mark_ready(self, checks: dict[str, str]) -> None:
+        self.checks.update(checks)
+        self.warmed_up = True
+        logger.info("Warm-up done %.2fs after start: %s", time.monotonic() - self.started, checks)
+
+    def mark_stopping(self) -> None:
+        """Остановка началась: новых пользователей сюда больше не направлять"""
+        self.warmed_up = False
+
+    async def measure_loop_lag(self, interval: float = LOOP_LAG_INTERVAL) -> None:
+        """Спит interval и смотрит, на сколько проснулась позже: столько цикл был занят чужим кодом"""
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(interval)
+            self.loop_lag = max(0.0, loop.time() - started - interval)
+            self.loop_lag_max = max(self.loop_lag_max, self.loop_lag)
+            if self.loop_lag > HEALTH_MAX_LOOP_LAG:
+                logger.warning("Event loop lag %.2fs", self.loop_lag)
+
+    def _poll_ages(self) -> dict[str, Optional[float]]:
+        now = time.monotonic()
+        return {
+            name: (now - self.last_poll[bot_id]) if bot_id in self.last_poll else None
+            for name, bot_id in self.bots.items()
+        }
+
+    def live(self) -> bool:
+        """Процесс не завис: цикл событий отвечает, polling каждого бота получает ответы"""
+        if self.loop_lag > HEALTH_MAX_LOOP_LAG:
+            return False
+        for age in self._poll_ages().values():
+            # До первого getUpdates (прогрев, запуск polling) отсчитываем от старта процесса
+            if (age if age is not None else time.monotonic() - self.started) > HEALTH_MAX_POLL_AGE:
+                return False
+        return True
+
+    def ready(self) -> bool:
+        """Прогрев закончен и каждый бот уже получил ответ на getUpdates"""
+        return self.warmed_up and self.live() and all(age is not None for age in self._poll_ages().values())
+
+    @staticmethod
+    def _collect(sources: dict[str, Callable[[], Any]]) -> dict[str, Any]:
+        values = {}
+        for name, source in sources.items():
+            try:
+                values[name] = source()
+            except Exception as e:
+                values[name] = f"error: {e}"
+        return values
+
+    def report(self) -> dict:
+        queues = self._collect(self.queues)
+        queues["tasks"] = {name: group["pending"] for name, group in supervisor.stats().items()}
+        return {
+            "live": self.live(),
+            "ready": self.ready(),
+            "uptime": round(time.monotonic() - self.started, 1),
+            "checks": self.checks,
+            "loop_lag_ms": round(self.loop_lag * 1000, 1),
+            "loop_lag_max_ms": round(self.loop_lag_max * 1000, 1),
+            "last_update": self.last_update,
+            "last_update_age": round(time.time() - self.last_update, 1) if self.last_update else None,
+            "updates_ok": self.updates_ok,
+            "last_poll_age": {name: None if age is None else round(age, 1) for name, age in self._poll_ages().items()},
+            "queues": queues,
+            "metrics": self._collect(self.metrics),
+        }
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        report = self.report()
+        ok = report["ready"] if request.path == "/ready" else report["live"]
+        return web.Response(
+            text=json.dumps(report, ensure_ascii=False, default=str),
+            status=200 if ok else 503,
+            content_type="application/json",
+        )
+
+    async def start(self, host: str = HEALTH_HOST, port: int = HEALTH_PORT) -> None:
+        """Поднимает HTTP-проверку и замер задержки цикла событий"""
+        supervisor.group("health", retries=None, retry_delay=1.0)
+        supervisor.spawn("health", self.measure_loop_lag)
+        if not port:
+            return
+        app = web.Application()
+        app.router.add_get("/health", self._handle)
+        app.router.add_get("/ready", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info("Health check on http://%s:%d/health and /ready", host, port)
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+# Единый на процесс
+health = HealthMonitor()
@@ -0,0 +1,188 @@
+import logging
+import os
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Any, Optional
+
+from aiogram import Bot, __version__
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiohttp import ClientSession, TraceConfig, TraceConnectionQueuedEndParams, TraceConnectionQueuedStartParams
+from aiohttp.hdrs import USER_AGENT
+from aiohttp.http import SERVER_SOFTWARE
+
+logger = logging.getLogger(__name__)
+
+# Размер пула соединений к Bot API и время жизни простаивающего keep-alive соединения (сек)
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "60"))
+# Сколько кэшировать DNS-ответ (сек)
+HTTP_DNS_TTL = int(os.getenv("HTTP_DNS_TTL", "3600"))
+# Таймаут запроса по умолчанию и отдельные таймауты методов: "sendPhoto=60,answerCallbackQuery=10"
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+HTTP_METHOD_TIMEOUTS = os.getenv("HTTP_METHOD_TIMEOUTS", "sendPhoto=60,answerCallbackQuery=10")
+
+
+def parse_method_timeouts(raw: str) -> dict[str, float]:
+    """Разбирает строку вида 'sendPhoto=60,answerCallbackQuery=10'"""
+    timeouts = {}
+    for item in raw.split(","):
+        if "=" not in item:
+            continue
+        method, value = item.split("=", 1)
+        timeouts[method.strip()] = float(value)
+    return timeouts
+
+
+class PooledAiohttpSession(AiohttpSession):
+    """
+    Сессия Bot API с настроенным пулом keep-alive соединений, кэшем DNS,
+    таймаутами по методам и метриками: задержка запросов по методам,
+    новые/переиспользованные соединения, ожидание свободного соединения в пуле.
+    """
+
+    def __init__(
+        self,
+        limit: int = HTTP_POOL_LIMIT,
+        keepalive_timeout: float = HTTP_KEEPALIVE_TIMEOUT,
+        dns_ttl: int = HTTP_DNS_TTL,
+        timeout: float = HTTP_TIMEOUT,
+        method_timeouts: Optional[dict[str, float]] = None,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(limit=limit, timeout=timeout, **kwargs)
+        self._connector_init.update(
+            keepalive_timeout=keepalive_timeout,
+            ttl_dns_cache=dns_ttl,
+            use_dns_cache=True,
+        )
+        self.method_timeouts = (
+            method_timeouts if method_timeouts is not None else parse_method_timeouts(HTTP_METHOD_TIMEOUTS)
+        )
+
+        # Метрики
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.dns_cache_hits = 0
+        self.dns_cache_misses = 0
+        self.pool_waits = 0
+        self.pool_wait_total = 0.0
+        # Запросы в работе, включая ждущие свободного соединения (сравнивать с размером пула), и их максимум
+        self.requests_active = 0
+        self.requests_active_max = 0
+        # метод -> [количество, ошибки, суммарное время, максимум]
+        self._latency: dict[str, list] = defaultdict(lambda: [0, 0, 0.0, 0.0])
+        # id бота -> время (monotonic) последнего успешного getUpdates, для проверки живости
+        self.last_poll: dict[int, float] = {}
+
+    def _trace_config(self) -> TraceConfig:
+        trace = TraceConfig()
+
+        async def on_created(*_: Any) -> None:
+            self.connections_created += 1
+
+        async def on_reused(*_: Any) -> None:
+            self.connections_reused += 1
+
+        async def on_dns_hit(*_: Any) -> None:
+            self.dns_cache_hits += 1
+
+        async def on_dns_miss(*_: Any) -> None:
+            self.dns_cache_misses += 1
+
+        async def on_request_start(*_: Any) -> None:
+            self.requests_active += 1
+            self.requests_active_max = max(self.requests_active_max, self.requests_active)
+
+        async def on_request_done(*_: Any) -> None:
+            self.requests_active -= 1
+
+        async def on_queued_start(_: ClientSession, ctx: SimpleNamespace, __: TraceConnectionQueuedStartParams) -> None:
+            ctx.queued_at = time.perf_counter()
+
+        async def on_queued_end(_: ClientSession, ctx: SimpleNamespace, __: TraceConnectionQueuedEndParams) -> None:
+            self.pool_waits += 1
+            self.pool_wait_total += time.perf_counter() - ctx.queued_at
+
+        trace.on_connection_create_end.append(on_created)
+        trace.on_connection_reuseconn.append(on_reused)
+        trace.on_dns_cache_hit.append(on_dns_hit)
+        trace.on_dns_cache_miss.append(on_dns_miss)
+        trace.on_connection_queued_start.append(on_queued_start)
+        trace.on_connection_queued_end.append(on_queued_end)
+        trace.on_request_start.append(on_request_start)
+        trace.on_request_end.append(on_request_done)
+        trace.on_request_exception.append(on_request_done)
+        return trace
+
+    async def create_session(self) -> ClientSession:
+        # Как в AiohttpSession, но с trace_configs для метрик соединений
+        if self._should_reset_connector:
+            await self.close()
+
+        if self._session is None or self._session.closed:
+            self._session = ClientSession(
+                connector=self._connector_type(**self._connector_init),
+                headers={
+                    USER_AGENT: f"{SERVER_SOFTWARE} aiogram/{__version__}",
+                },
+                trace_configs=[self._trace_config()],
+            )
+            self._should_reset_connector = False
+
+        return self._session
+
+    async def make_request(
+        self, bot: Bot, method: TelegramMethod[TelegramType], timeout: Optional[int] = None
+    ) -> TelegramType:
+        name = method.__api_method__
+        if timeout is None:
+            timeout = self.method_timeouts.get(name)
+
+        started = time.perf_counter()
+        stats = self._latency[name]
+        try:
+            result = await super().make_request(bot, method, timeout)
+            if name == "getUpdates":
+                self.last_poll[bot.id] = time.monotonic()
+            return result
+        except Exception:
+            stats[1] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            stats[0] += 1
+            stats[2] += elapsed
+            stats[3] = max(stats[3], elapsed)
+
+    def stats(self) -> dict:
+        """Метрики HTTP-сессии для подбора размера пула"""
+        total = self.connections_created + self.connections_reused
+        return {
+            "pool_limit": self._connector_init.get("limit"),
+            "requests_active": self.requests_active,
+            "requests_active_max": self.requests_active_max,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "reuse_ratio": self.connections_reused / total if total else 0.0,
+            "dns_cache_hits": self.dns_cache_hits,
+            "dns_cache_misses": self.dns_cache_misses,
+            "pool_waits": self.pool_waits,
+            "pool_wait_avg": self.pool_wait_total / self.pool_waits if self.pool_waits else 0.0,
+            "methods": {
+                name: {
+                    "count": count,
+                    "errors": errors,
+                    "avg": total_time / count if count else 0.0,
+                    "max": max_time,
+                }
+                for name, (count, errors, total_time, max_time) in sorted(self._latency.items())
+            },
+        }
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            logger.info("Bot API session stats: %s", self.stats())
+        await super().close()
@@ -5,6 +5,8 @@ from typing import Optional
 
 from aiogram import Bot
 
+from app.core.tasks import supervisor
+
 
 class TelegramLogHandler(logging.Handler):
     """Handler для отправки ошибок и критических сообщений в Telegram"""
@@ -126,10 +128,22 @@ class TelegramLogHandler(logging.Handler):
                 # Игнорируем ошибки, продолжаем работу
                 pass
     
+    def pending(self) -> int:
+        """Сколько сообщений ждёт отправки в Telegram"""
+        return self._queue.qsize() if self._queue else 0
+
     def start_sender(self) -> None:
         """Запускает фоновую задачу для отправки сообщений"""
         if self._queue and not self._task:
-            self._task = asyncio.create_task(self._message_sender())
+            self._task = supervisor.spawn("logging", self._message_sender)
+    
+    async def flush(self, timeout: float = 5.0) -> None:
+        """Дожидается отправки накопленных сообщений (с ограничением по времени)"""
+        if self._queue and self._task:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                pass
     
     def stop_sender(self) -> None:
         """Останавливает фоновую задачу"""
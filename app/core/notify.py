@@ -0,0 +1,128 @@
+import html
+import logging
+import os
+import time
+from collections import deque
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.types import User
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+from app.core.tasks import supervisor
+from app.core.tenants import TenantLocal, get_admin_id
+
+logger = logging.getLogger(__name__)
+
+# Пока за NOTIFY_RATE_WINDOW сек событий не больше NOTIFY_RATE_LIMIT — каждое уходит админу сразу,
+# дальше они копятся и уходят одной сводкой раз в NOTIFY_BATCH_WINDOW сек
+NOTIFY_RATE_WINDOW = float(os.getenv("NOTIFY_RATE_WINDOW", "60"))
+NOTIFY_RATE_LIMIT = int(os.getenv("NOTIFY_RATE_LIMIT", "10"))
+NOTIFY_BATCH_WINDOW = float(os.getenv("NOTIFY_BATCH_WINDOW", "300"))
+
+supervisor.group(
+    "notify",
+    limit=1,
+    retries=2,
+    retry_on=(TelegramNetworkError, TelegramServerError, TelegramRetryAfter),
+    retry_delay=5.0,
+)
+
+
+class AdminNotifier:
+    """
+    Уведомления админу о новых пользователях и завершённых тестах.
+    При обычном потоке — по сообщению на событие, при всплеске — сводки вида
+    «+57 новых, 41 завершили, средний балл 29», чтобы не упереться в лимит Telegram на один чат.
+    """
+
+    def __init__(
+        self,
+        rate_window: float = NOTIFY_RATE_WINDOW,
+        rate_limit: int = NOTIFY_RATE_LIMIT,
+        batch_window: float = NOTIFY_BATCH_WINDOW,
+    ) -> None:
+        self.rate_window = rate_window
+        self.rate_limit = rate_limit
+        self.batch_window = batch_window
+        self._events: deque = deque()
+        # Копящаяся сводка: бот и чат, куда её отправить, и счётчики
+        self._batch: Optional[dict] = None
+        self.sent = 0
+        self.coalesced = 0
+
+    def new_user(self, bot: Bot, label: str) -> None:
+        self._add(bot, f"Новый пользователь начал проходить тест: {label}", new=1)
+
+    def test_finished(self, bot: Bot, label: str, score: int) -> None:
+        self._add(bot, f"Пользователь {label}, результат - {score}", finished=1, score=score)
+
+    def _add(self, bot: Bot, text: str, new: int = 0, finished: int = 0, score: int = 0) -> None:
+        if not get_admin_id():
+            return
+        now = time.monotonic()
+        self._events.append(now)
+        while self._events and now - self._events[0] > self.rate_window:
+            self._events.popleft()
+
+        if self._batch is None and len(self._events) <= self.rate_limit:
+            self.sent += 1
+            supervisor.spawn("notify", self._send, bot, get_admin_id(), text)
+            return
+
+        if self._batch is None:
+            self._batch = {"bot": bot, "chat_id": get_admin_id(), "started": now, "new": 0, "finished": 0, "score": 0}
+            supervisor.spawn("notify", self._flush_later, delay=self.batch_window)
+        self.coalesced += 1
+        self._batch["new"] += new
+        self._batch["finished"] += finished
+        self._batch["score"] += score
+
+    def _take_summary(self) -> Optional[tuple[Bot, int, str]]:
+        batch, self._batch = self._batch, None
+        if not batch or not (batch["new"] or batch["finished"]):
+            return None
+        minutes = max(1, round((time.monotonic() - batch["started"]) / 60))
+        parts = [f"+{batch['new']} новых", f"{batch['finished']} завершили"]
+        if batch["finished"]:
+            parts.append(f"средний балл {batch['score'] / batch['finished']:.0f}")
+        self.sent += 1
+        return batch["bot"], batch["chat_id"], f"За {minutes} мин: " + ", ".join(parts)
+
+    async def _flush_later(self) -> None:
+        """Конец окна сводки. Если всплеск продолжается, следующее событие начнёт новую"""
+        summary = self._take_summary()
+        if summary is not None:
+            supervisor.spawn("notify", self._send, *summary)
+
+    async def flush(self) -> None:
+        """Отправляет накопленную сводку сразу (при остановке бота)"""
+        summary = self._take_summary()
+        if summary is not None:
+            await self._send(*summary)
+
+    @staticmethod
+    async def _send(bot: Bot, chat_id: int, text: str) -> None:
+        await bot.send_message(chat_id, text)
+
+
+def user_label(user: User) -> str:
+    """Как показать пользователя админу: @username, ссылка с именем или ID"""
+    if user.username:
+        return f"@{user.username}"
+    if user.full_name:
+        return f'<a href="tg://user?id={user.id}">@{html.escape(user.full_name)}</a>'
+    return f"ID: {user.id}"
+
+
+# У каждого бота свой админ и свой поток событий
+NOTIFIERS: TenantLocal = TenantLocal(AdminNotifier)
+
+
+async def flush_notifications() -> None:
+    """При остановке: отправить сводки, которые ещё копятся"""
+    for notifier in NOTIFIERS.all().values():
+        try:
+            await notifier.flush()
+        except Exception:
+            logger.exception("Failed to send admin summary")
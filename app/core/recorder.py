@@ -0,0 +1,103 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import secrets
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, Optional, TextIO
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+logger = logging.getLogger(__name__)
+
+# Каталог для записи входящих апдейтов; пусто — запись выключена
+RECORD_UPDATES_DIR = os.getenv("RECORD_UPDATES_DIR", "")
+# Соль для обезличивания id; без неё берётся случайная на время жизни процесса
+RECORD_SALT = os.getenv("RECORD_SALT", "")
+
+# Объекты, в которых лежат данные пользователя или чата
+_PERSON_KEYS = {"from", "chat", "user", "sender_chat"}
+_NAME_KEYS = ("username", "first_name", "last_name", "title")
+
+
+class UpdateRecorderMiddleware(BaseMiddleware):
+    """
+    Пишет входящие апдейты в сжатые JSONL-файлы (по файлу на час) для последующего
+    воспроизведения app/tools/replay.py. id пользователей и чатов заменяются
+    стабильными псевдонимами, имена — на user<псевдоним>, время получения сохраняется.
+    """
+
+    def __init__(self, directory: str = RECORD_UPDATES_DIR, salt: str = RECORD_SALT) -> None:
+        self.directory = directory
+        self._salt = (salt or secrets.token_hex(16)).encode()
+        self._file: Optional[TextIO] = None
+        self._file_hour = ""
+        self.recorded = 0
+        os.makedirs(directory, exist_ok=True)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if isinstance(event, Update):
+            try:
+                self._write(event)
+            except Exception:
+                logger.exception("Failed to record update %s", event.update_id)
+        return await handler(event, data)
+
+    def anonymize_id(self, value: int) -> int:
+        digest = hashlib.blake2b(str(value).encode(), key=self._salt, digest_size=6).digest()
+        return int.from_bytes(digest, "big")
+
+    def _anonymize(self, obj: Any, person: bool = False) -> Any:
+        if isinstance(obj, dict):
+            result = {key: self._anonymize(value, key in _PERSON_KEYS) for key, value in obj.items()}
+            if person and isinstance(result.get("id"), int):
+                result["id"] = self.anonymize_id(result["id"])
+                for key in _NAME_KEYS:
+                    if key in result:
+                        result[key] = f"user{result['id']}"
+            return result
+        if isinstance(obj, list):
+            return [self._anonymize(item) for item in obj]
+        return obj
+
+    def _write(self, update: Update) -> None:
+        now = time.time()
+        hour = time.strftime("%Y%m%d-%H", time.gmtime(now))
+        if hour != self._file_hour:
+            self.close()
+            path = os.path.join(self.directory, f"updates-{hour}.jsonl.gz")
+            self._file = gzip.open(path, "at", encoding="utf-8")
+            self._file_hour = hour
+
+        payload = self._anonymize(update.model_dump(mode="json", by_alias=True, exclude_none=True))
+        self._file.write(json.dumps({"ts": now, "update": payload}, ensure_ascii=False) + "\n")
+        self.recorded += 1
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_recording(paths: Iterable[str]) -> Iterator[tuple[float, dict]]:
+    """Читает записи (ts, update) из файлов в порядке времени получения"""
+    records = []
+    for path in paths:
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        item = json.loads(line)
+                        records.append((item["ts"], item["update"]))
+        except (EOFError, ValueError):
+            # файл оборван (процесс убили во время записи) — берём то, что успели прочитать
+            logger.warning("Recording %s is truncated, using %d records read so far", path, len(records))
+    records.sort(key=lambda record: record[0])
+    return iter(records)
@@ -0,0 +1,99 @@
+import sys
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Callable, Generic, Iterator, Optional, TypeVar
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+class TTLStore(MutableMapping, Generic[K, V]):
+    """
+    Словарь в памяти с ограничением по времени жизни и размеру.
+    - каждое обращение к записи продлевает её жизнь и делает её «свежей»;
+    - записи старше ttl секунд удаляются при sweep();
+    - при превышении max_size вытесняется самая давно не использованная запись.
+    on_evict(key, value, reason) вызывается для вытесненных записей ("ttl" / "lru").
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        max_size: int,
+        on_evict: Optional[Callable[[K, V, str], None]] = None,
+    ) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+        self.on_evict = on_evict
+        self.evicted_ttl = 0
+        self.evicted_lru = 0
+        self._data: "OrderedDict[K, tuple[float, V]]" = OrderedDict()
+
+    def __getitem__(self, key: K) -> V:
+        _, value = self._data[key]
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        return value
+
+    def __setitem__(self, key: K, value: V) -> None:
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            old_key, (_, old_value) = self._data.popitem(last=False)
+            self.evicted_lru += 1
+            self._evicted(old_key, old_value, "lru")
+
+    def __delitem__(self, key: K) -> None:
+        del self._data[key]
+
+    def __iter__(self) -> Iterator[K]:
+        return iter(list(self._data))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._data
+
+    def items(self) -> list[tuple[K, V]]:
+        """Снимок записей без продления их жизни"""
+        return [(key, value) for key, (_, value) in self._data.items()]
+
+    def values(self) -> list[V]:
+        return [value for _, value in self._data.values()]
+
+    def sweep(self) -> int:
+        """Удаляет просроченные записи. Возвращает их количество"""
+        deadline = time.monotonic() - self.ttl
+        removed = 0
+        # Записи упорядочены по последнему обращению: старые — в начале
+        while self._data:
+            key, (touched, value) = next(iter(self._data.items()))
+            if touched > deadline:
+                break
+            del self._data[key]
+            removed += 1
+            self._evicted(key, value, "ttl")
+        self.evicted_ttl += removed
+        return removed
+
+    def _evicted(self, key: K, value: V, reason: str) -> None:
+        if self.on_evict is not None:
+            self.on_evict(key, value, reason)
+
+
+def get_rss_bytes() -> int:
+    """Текущий RSS процесса (в контейнере берём из /proc, иначе — пиковый из rusage)"""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource  # нет на Windows, поэтому импортируем только здесь
+
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # на macOS ru_maxrss в байтах, на Linux — в килобайтах
+    return usage if sys.platform == "darwin" else usage * 1024
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, fields
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.types import TelegramObject
+
+from app.core.logging import TelegramLogHandler
+from app.core.notify import flush_notifications
+from app.core.tasks import supervisor
+from app.core.tenants import DEFAULT_TENANT, TENANTS, all_tenants, tenant_name, use_tenant
+from app.promo import PENDING_PROMOS, start_promo
+from app.routers.test import RESULT_PAGES, RESULT_PHOTOS, SESSIONS, UserSession
+
+logger = logging.getLogger(__name__)
+
+# Сколько ждём завершения уже начатых обработчиков при остановке (сек)
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "20"))
+# Файл, куда сохраняется состояние между перезапусками (рядом с БД)
+STATE_PATH = os.getenv("STATE_PATH", "/data/state.json")
+
+
+class InFlightMiddleware(BaseMiddleware):
+    """Считает обработчики, которые выполняются прямо сейчас"""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        self.count += 1
+        self._idle.clear()
+        try:
+            return await handler(event, data)
+        finally:
+            self.count -= 1
+            if self.count == 0:
+                self._idle.set()
+
+    async def wait_idle(self, timeout: float) -> bool:
+        """Ждёт, пока не останется активных обработчиков. False — если не дождались"""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+def save_state(path: str = STATE_PATH) -> None:
+    """
+    Сохраняет сессии теста, страницы результатов, отложенные рекламы
+    и file_id картинок результата всех ботов в файл
+    """
+    tenants = {}
+    for tenant in all_tenants():
+        with use_tenant(tenant):
+            tenants[tenant_name()] = {
+                "sessions": {str(uid): asdict(s) for uid, s in SESSIONS.items()},
+                "result_pages": {str(uid): pages for uid, pages in RESULT_PAGES.items()},
+                "promos": {str(uid): [chat_id, due] for uid, (chat_id, due) in PENDING_PROMOS.items()},
+                "photos": dict(RESULT_PHOTOS.items()),
+            }
+    state = {"saved_at": time.time(), "tenants": tenants}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    for name, saved in tenants.items():
+        logger.info(
+            "State saved [%s]: %d sessions, %d result pages, %d promos",
+            name, len(saved["sessions"]), len(saved["result_pages"]), len(saved["promos"]),
+        )
+
+
+def restore_state(bots: dict[str, Bot], path: str = STATE_PATH) -> None:
+    """
+    Восстанавливает состояние после перезапуска и перезапускает таймеры рекламы.
+    bots — бот каждого тенанта по имени.
+    Файл переименовывается до применения, а каждая запись восстанавливается отдельно:
+    файл от другой версии бота или с битыми записями не должен ронять каждый следующий запуск.
+    """
+    if not os.path.exists(path):
+        return
+    try:
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        logger.exception("Failed to read saved state from %s", path)
+        state = {}
+    try:
+        # Последний применённый файл остаётся рядом — для разбора, если что-то не восстановилось
+        os.replace(path, f"{path}.restored")
+    except OSError:
+        logger.exception("Failed to move away saved state %s", path)
+    if not isinstance(state, dict):
+        return
+
+    # Файл от версии с одним ботом
+    saved_tenants = state.get("tenants") or {DEFAULT_TENANT: state}
+    by_name = {tenant.name: tenant for tenant in TENANTS}
+    # Поля сессии и их типы (у всех полей UserSession есть значения по умолчанию)
+    session_fields = {field.name: type(field.default) for field in fields(UserSession)}
+    now = time.time()
+    for name, saved in saved_tenants.items():
+        if name not in bots:
+            logger.warning("Saved state for unknown bot %s skipped", name)
+            continue
+        skipped = 0
+        with use_tenant(by_name.get(name)):
+            for uid, session in saved.get("sessions", {}).items():
+                try:
+                    known = {key: value for key, value in session.items() if key in session_fields}
+                    if not all(isinstance(value, session_fields[key]) for key, value in known.items()):
+                        raise TypeError(f"bad session fields: {known}")
+                    SESSIONS.setdefault(int(uid), UserSession(**known))
+                except (TypeError, ValueError, AttributeError):
+                    skipped += 1
+            for uid, pages in saved.get("result_pages", {}).items():
+                try:
+                    RESULT_PAGES.setdefault(int(uid), pages)
+                except (TypeError, ValueError):
+                    skipped += 1
+            try:
+                RESULT_PHOTOS.current().update(saved.get("photos", {}))
+            except (TypeError, ValueError):
+                skipped += 1
+            for uid, promo in saved.get("promos", {}).items():
+                try:
+                    chat_id, due = promo
+                    start_promo(bots[name], chat_id=chat_id, telegram_id=int(uid), delay=max(0.0, due - now))
+                except (TypeError, ValueError):
+                    skipped += 1
+            logger.info(
+                "State restored [%s]: %d sessions, %d result pages, %d promos, %d entries skipped",
+                name, len(SESSIONS), len(RESULT_PAGES), len(PENDING_PROMOS), skipped,
+            )
+
+
+async def graceful_shutdown(
+    in_flight: InFlightMiddleware,
+    log_handler: Optional[TelegramLogHandler] = None,
+    timeout: float = SHUTDOWN_TIMEOUT,
+) -> None:
+    """
+    Порядок остановки (polling к этому моменту уже остановлен aiogram'ом):
+    1. ждём завершения начатых обработчиков (не дольше timeout);
+    2. отправляем накопившиеся логи в Telegram;
+    3. сохраняем сессии и таймеры рекламы;
+    4. отправляем накопленные сводки админу;
+    5. отменяем фоновые задачи.
+    Сессию бота после этого закрывает сам Dispatcher.
+    """
+    started = time.monotonic()
+    if not await in_flight.wait_idle(timeout):
+        logger.warning("Shutdown deadline reached with %d handlers still running", in_flight.count)
+
+    if log_handler is not None:
+        await log_handler.flush(timeout=max(1.0, timeout - (time.monotonic() - started)))
+        log_handler.stop_sender()
+
+    try:
+        save_state()
+    except OSError:
+        logger.exception("Failed to save state to %s", STATE_PATH)
+
+    # Недокопленные сводки для админа отправляем сейчас, иначе они пропадут вместе с задачами
+    await flush_notifications()
+
+    await supervisor.shutdown(timeout=max(1.0, timeout - (time.monotonic() - started)))
+    logger.info("Graceful shutdown finished in %.2fs", time.monotonic() - started)
@@ -0,0 +1,141 @@
+"""
+Время запуска: от старта процесса до start_polling и до первого обработанного апдейта.
+С STARTUP_PROFILE=1 ещё и время импорта каждого модуля (собственное, без вложенных импортов).
+Импортируется в app/main.py первым, чтобы замер импорта охватил aiogram и все роутеры.
+"""
+import importlib.machinery
+import logging
+import os
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Профилирование запуска: время импорта модулей и отчёт при первом апдейте
+STARTUP_PROFILE = os.getenv("STARTUP_PROFILE", "") not in ("", "0")
+# Сколько самых долгих модулей показывать в отчёте
+STARTUP_PROFILE_TOP = int(os.getenv("STARTUP_PROFILE_TOP", "15"))
+
+# Загрузчики, которые создаются на каждый модуль: им можно подменить exec_module у экземпляра
+_TIMED_LOADERS = (
+    importlib.machinery.SourceFileLoader,
+    importlib.machinery.SourcelessFileLoader,
+    importlib.machinery.ExtensionFileLoader,
+)
+
+
+def process_started() -> float:
+    """Время старта процесса (unix time) по /proc, вне Linux — время импорта этого модуля"""
+    try:
+        with open("/proc/self/stat", encoding="ascii") as f:
+            # Имя процесса в скобках может содержать пробелы, поля считаем после него
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime", encoding="ascii") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - (uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+
+class _ImportTimer:
+    """
+    Meta path finder: сам модули не ищет, а оборачивает exec_module у найденных,
+    считая время выполнения тела модуля за вычетом вложенных импортов
+    """
+
+    def __init__(self, profile: "StartupProfile") -> None:
+        self.profile = profile
+        self._stack: list[list] = []
+
+    def find_spec(self, name: str, path: Any = None, target: Any = None) -> Optional[importlib.machinery.ModuleSpec]:
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is None:
+                continue
+            if isinstance(spec.loader, _TIMED_LOADERS):
+                self._wrap(spec.loader, name)
+            return spec
+        return None
+
+    def _wrap(self, loader: Any, name: str) -> None:
+        exec_module = loader.exec_module
+
+        def timed_exec_module(module: Any) -> None:
+            # [модуль, время начала, время вложенных импортов]
+            frame = [name, time.perf_counter(), 0.0]
+            self._stack.append(frame)
+            try:
+                exec_module(module)
+            finally:
+                self._stack.pop()
+                total = time.perf_counter() - frame[1]
+                self.profile.imports[name] = (total - frame[2], total)
+                if self._stack:
+                    self._stack[-1][2] += total
+
+        loader.exec_module = timed_exec_module
+
+
+class StartupProfile:
+    """
+    Вехи запуска (секунды от старта процесса). Как outer middleware на dp.update
+    отмечает первый обработанный апдейт; после него ничего не делает.
+    """
+
+    def __init__(self) -> None:
+        self.started = process_started()
+        self.phases: list[tuple[str, float]] = []
+        # модуль -> (собственное время, вместе с вложенными импортами)
+        self.imports: dict[str, tuple[float, float]] = {}
+        self.first_update_seen = False
+        self._timer: Optional[_ImportTimer] = None
+
+    def enable_import_timing(self) -> None:
+        if self._timer is None:
+            self._timer = _ImportTimer(self)
+            sys.meta_path.insert(0, self._timer)
+
+    def disable_import_timing(self) -> None:
+        if self._timer is not None:
+            sys.meta_path.remove(self._timer)
+            self._timer = None
+
+    def mark(self, phase: str) -> float:
+        elapsed = time.time() - self.started
+        self.phases.append((phase, elapsed))
+        return elapsed
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any],
+    ) -> Any:
+        if self.first_update_seen:
+            return await handler(event, data)
+        self.first_update_seen = True
+        try:
+            return await handler(event, data)
+        finally:
+            logger.info("First update handled %.2fs after process start", self.mark("first update"))
+            if STARTUP_PROFILE:
+                logger.info("Startup profile:\n%s", self.report())
+
+    def report(self, top: int = STARTUP_PROFILE_TOP) -> str:
+        lines = [f"  {elapsed:8.3f}s  {phase}" for phase, elapsed in self.phases]
+        if self.imports:
+            total = sum(own for own, _ in self.imports.values())
+            lines.append(f"  imports: {len(self.imports)} modules, {total:.3f}s; slowest (own / with nested):")
+            slowest = sorted(self.imports.items(), key=lambda item: item[1][0], reverse=True)[:top]
+            for name, (own, cumulative) in slowest:
+                lines.append(f"  {own * 1000:8.1f}ms {cumulative * 1000:8.1f}ms  {name}")
+        return "\n".join(lines)
+
+
+# Единый на процесс; замер импорта включается сразу, пока не импортирован aiogram
+startup = StartupProfile()
+if STARTUP_PROFILE:
+    startup.enable_import_timing()
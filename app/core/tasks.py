@@ -0,0 +1,165 @@
+import asyncio
+import logging
+from collections import Counter
+from typing import Any, Awaitable, Callable, Optional
+
+from app.core.tracing import detached_context
+
+logger = logging.getLogger(__name__)
+
+# Верхняя граница паузы между перезапусками (сек)
+MAX_RETRY_DELAY = 300.0
+
+
+class TaskGroup:
+    """
+    Группа фоновых задач с общей политикой:
+    limit — сколько задач группы выполняется одновременно (None — без ограничения),
+    max_pending — сколько задач группы может существовать всего (включая ожидающие),
+    retries — сколько раз перезапускать упавшую задачу (None — всегда),
+    retry_on — какие исключения считать поводом для перезапуска,
+    retry_delay — пауза перед первым перезапуском, дальше удваивается.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limit: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        retries: Optional[int] = 0,
+        retry_on: tuple[type[BaseException], ...] = (Exception,),
+        retry_delay: float = 1.0,
+    ) -> None:
+        self.name = name
+        self.limit = limit
+        self.max_pending = max_pending
+        self.retries = retries
+        self.retry_on = retry_on
+        self.retry_delay = retry_delay
+        self.tasks: set[asyncio.Task] = set()
+        self.running = 0
+        self.counters: Counter = Counter()
+        self.semaphore = asyncio.Semaphore(limit) if limit else None
+
+    def stats(self) -> dict:
+        return {"pending": len(self.tasks), "running": self.running, **self.counters}
+
+
+class TaskSupervisor:
+    """
+    Владелец всех фоновых задач бота: держит ссылки на них (чтобы задачу не собрал GC),
+    логирует исключения, перезапускает по политике группы и отменяет всё при остановке.
+    """
+
+    def __init__(self) -> None:
+        self.groups: dict[str, TaskGroup] = {}
+        self._closing = False
+
+    def group(self, name: str, **policy: Any) -> TaskGroup:
+        """Группа по имени; при первом обращении создаётся с переданной политикой"""
+        if name not in self.groups:
+            self.groups[name] = TaskGroup(name, **policy)
+        return self.groups[name]
+
+    def spawn(
+        self,
+        group_name: str,
+        func: Callable[..., Awaitable[Any]],
+        *args: Any,
+        delay: float = 0.0,
+        name: Optional[str] = None,
+    ) -> Optional[asyncio.Task]:
+        """
+        Запускает func(*args) в группе. Передаётся функция, а не корутина, — чтобы её можно было перезапустить.
+        delay — отложенный старт; ожидание не занимает места в limit.
+        Возвращает None, если бот останавливается или группа переполнена.
+        """
+        group = self.group(group_name)
+        if self._closing:
+            group.counters["rejected"] += 1
+            return None
+        if group.max_pending is not None and len(group.tasks) >= group.max_pending:
+            group.counters["rejected"] += 1
+            logger.warning("Task group %s is full (%d tasks), %s dropped", group_name, len(group.tasks), func.__name__)
+            return None
+
+        # Контекст вызывающего (бот, тенант) наследуется, а спан апдейта — нет.
+        # Тот же контекст — и у done-callback, иначе он сохранил бы копию со спаном
+        context = detached_context()
+        task = asyncio.create_task(
+            self._run(group, func, args, delay),
+            name=f"{group_name}:{name or func.__name__}",
+            context=context,
+        )
+        group.tasks.add(task)
+        group.counters["started"] += 1
+        task.add_done_callback(lambda t: self._done(group, t), context=context)
+        return task
+
+    @staticmethod
+    def _done(group: TaskGroup, task: asyncio.Task) -> None:
+        group.tasks.discard(task)
+        if task.cancelled():
+            group.counters["cancelled"] += 1
+
+    async def _run(self, group: TaskGroup, func: Callable[..., Awaitable[Any]], args: tuple, delay: float) -> Any:
+        if delay > 0:
+            await asyncio.sleep(delay)
+        attempt = 0
+        while True:
+            try:
+                if group.semaphore is None:
+                    return await self._call(group, func, args)
+                async with group.semaphore:
+                    return await self._call(group, func, args)
+            except group.retry_on as e:
+                if group.retries is not None and attempt >= group.retries:
+                    group.counters["failed"] += 1
+                    logger.error("Task %s/%s failed", group.name, func.__name__, exc_info=e)
+                    return None
+                pause = min(MAX_RETRY_DELAY, group.retry_delay * 2 ** attempt)
+                attempt += 1
+                group.counters["retried"] += 1
+                logger.warning(
+                    "Task %s/%s failed (%s: %s), retry %d in %.0fs",
+                    group.name, func.__name__, type(e).__name__, e, attempt, pause,
+                )
+                await asyncio.sleep(pause)
+            except Exception:
+                group.counters["failed"] += 1
+                logger.exception("Task %s/%s failed", group.name, func.__name__)
+                return None
+
+    @staticmethod
+    async def _call(group: TaskGroup, func: Callable[..., Awaitable[Any]], args: tuple) -> Any:
+        group.running += 1
+        try:
+            result = await func(*args)
+            group.counters["finished"] += 1
+            return result
+        finally:
+            group.running -= 1
+
+    def cancel_group(self, group_name: str) -> None:
+        group = self.groups.get(group_name)
+        if group is not None:
+            for task in list(group.tasks):
+                task.cancel()
+
+    async def shutdown(self, timeout: float = 5.0) -> None:
+        """Больше не принимает задачи, отменяет все и ждёт их завершения (не дольше timeout)"""
+        self._closing = True
+        tasks = [task for group in self.groups.values() for task in group.tasks]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+            if pending:
+                logger.warning("%d background tasks did not stop in %.1fs", len(pending), timeout)
+
+    def stats(self) -> dict[str, dict]:
+        return {name: group.stats() for name, group in self.groups.items()}
+
+
+# Единый на процесс: фоновые задачи запускаются только через него
+supervisor = TaskSupervisor()
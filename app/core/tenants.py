@@ -0,0 +1,235 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import Counter
+from collections.abc import MutableMapping
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+logger = logging.getLogger(__name__)
+
+# Файл со списком ботов (JSON-массив, поля — как у Tenant). Без него — один бот из BOT_TOKEN/ADMIN_ID
+TENANTS_FILE = os.getenv("TENANTS_FILE")
+ADMIN_ID = int(os.getenv("ADMIN_ID", "0"))
+# Сколько апдейтов одного бота обрабатывается одновременно. Меньше MAX_CONCURRENT_UPDATES,
+# чтобы всплеск у одного бота не занял все места остальных
+TENANT_MAX_CONCURRENT_UPDATES = int(os.getenv("TENANT_MAX_CONCURRENT_UPDATES", "25"))
+
+DEFAULT_TENANT = "default"
+
+
+@dataclass(frozen=True)
+class Tenant:
+    """
+    Один бот в процессе. Пути None — значения по умолчанию из app/db.py и app/backup.py.
+    promo_text — свой текст рекламы, в нём доступен {first_name}.
+    """
+
+    name: str
+    bot_token: str
+    admin_id: int
+    db_path: Optional[str] = None
+    archive_db_path: Optional[str] = None
+    backup_dir: Optional[str] = None
+    max_concurrent_updates: int = TENANT_MAX_CONCURRENT_UPDATES
+    promo_text: Optional[str] = None
+
+
+# Все боты процесса; заполняется load_tenants() при старте
+TENANTS: list[Tenant] = []
+
+_current_tenant: ContextVar[Optional[Tenant]] = ContextVar("current_tenant", default=None)
+
+
+def load_tenants(path: Optional[str] = TENANTS_FILE) -> list[Tenant]:
+    """
+    Читает список ботов из TENANTS_FILE. У каждого своя БД: по умолчанию /data/<name>/bot.db,
+    архив и резервные копии — рядом с ней.
+    """
+    if path:
+        with open(path, encoding="utf-8") as f:
+            raw = json.load(f)
+        tenants = []
+        for item in raw:
+            data_dir = os.path.join("/data", item["name"])
+            db_path = item.get("db_path") or os.path.join(data_dir, "bot.db")
+            base = os.path.dirname(db_path)
+            tenants.append(Tenant(
+                name=item["name"],
+                bot_token=item["bot_token"],
+                admin_id=int(item["admin_id"]),
+                db_path=db_path,
+                archive_db_path=item.get("archive_db_path") or os.path.join(base, "archive.db"),
+                backup_dir=item.get("backup_dir") or os.path.join(base, "backups"),
+                max_concurrent_updates=int(item.get("max_concurrent_updates", TENANT_MAX_CONCURRENT_UPDATES)),
+                promo_text=item.get("promo_text"),
+            ))
+        names = [tenant.name for tenant in tenants]
+        if len(set(names)) != len(names):
+            raise RuntimeError(f"Повторяющиеся имена ботов в {path}")
+    else:
+        token = os.getenv("BOT_TOKEN")
+        if not token:
+            raise RuntimeError("Не задан BOT_TOKEN в переменных окружения")
+        tenants = [Tenant(name=DEFAULT_TENANT, bot_token=token, admin_id=ADMIN_ID)]
+
+    TENANTS[:] = tenants
+    return tenants
+
+
+def get_tenant() -> Optional[Tenant]:
+    """Бот, в контексте которого выполняется код (None — вне апдейта и фоновых задач бота)"""
+    return _current_tenant.get()
+
+
+def tenant_name() -> str:
+    tenant = _current_tenant.get()
+    return tenant.name if tenant is not None else DEFAULT_TENANT
+
+
+def get_admin_id() -> int:
+    tenant = _current_tenant.get()
+    return tenant.admin_id if tenant is not None else ADMIN_ID
+
+
+@contextmanager
+def use_tenant(tenant: Optional[Tenant]) -> Iterator[Optional[Tenant]]:
+    """Выполнить блок от имени бота: БД, состояние в памяти и админ берутся его"""
+    token = _current_tenant.set(tenant)
+    try:
+        yield tenant
+    finally:
+        _current_tenant.reset(token)
+
+
+def all_tenants() -> list[Optional[Tenant]]:
+    """Для периодических задач: все боты, а вне бота (инструменты) — один проход без тенанта"""
+    return list(TENANTS) or [None]
+
+
+class TenantLocal(MutableMapping):
+    """
+    Отдельный экземпляр хранилища (dict, TTLStore, Counter) на каждого бота.
+    Обращения идут к экземпляру текущего бота, поэтому лимиты и вытеснение у ботов свои.
+    """
+
+    def __init__(self, factory: Callable[[], Any]) -> None:
+        self._factory = factory
+        self._by_tenant: dict[str, Any] = {}
+
+    def of(self, name: str) -> Any:
+        store = self._by_tenant.get(name)
+        if store is None:
+            store = self._by_tenant[name] = self._factory()
+        return store
+
+    def current(self) -> Any:
+        return self.of(tenant_name())
+
+    def all(self) -> dict[str, Any]:
+        return dict(self._by_tenant)
+
+    def __getitem__(self, key: Any) -> Any:
+        return self.current()[key]
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        self.current()[key] = value
+
+    def __delitem__(self, key: Any) -> None:
+        del self.current()[key]
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self.current()
+
+    def __iter__(self):
+        return iter(self.current())
+
+    def __len__(self) -> int:
+        return len(self.current())
+
+    # Свои реализации хранилища (TTLStore не продлевает жизнь записей при items()/get())
+    def get(self, key: Any, default: Any = None) -> Any:
+        return self.current().get(key, default)
+
+    def pop(self, key: Any, *default: Any) -> Any:
+        return self.current().pop(key, *default)
+
+    def setdefault(self, key: Any, default: Any = None) -> Any:
+        return self.current().setdefault(key, default)
+
+    def items(self):
+        return self.current().items()
+
+    def values(self):
+        return self.current().values()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.current(), name)
+
+
+class TenantMiddleware(BaseMiddleware):
+    """
+    Определяет бота по токену и выполняет апдейт в его контексте, считает метрики по ботам.
+    Лимит одновременно обрабатываемых апдейтов каждого бота (slot) берёт UserSerialMiddleware
+    уже после очереди пользователя, чтобы апдейт, ждущий своей очереди, не занимал место бота.
+    Регистрируется outer middleware на dp.update раньше UserSerialMiddleware.
+    """
+
+    def __init__(self, tenants: list[Tenant]) -> None:
+        self._by_token = {tenant.bot_token: tenant for tenant in tenants}
+        self._semaphores = {tenant.name: asyncio.Semaphore(tenant.max_concurrent_updates) for tenant in tenants}
+        self.metrics: dict[str, Counter] = {tenant.name: Counter() for tenant in tenants}
+        self._handle_time: Counter = Counter()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        tenant = self._by_token.get(data["bot"].token)
+        if tenant is None:
+            return await handler(event, data)
+
+        metrics = self.metrics[tenant.name]
+        metrics["updates"] += 1
+        data["tenant"] = tenant
+        with use_tenant(tenant):
+            try:
+                return await handler(event, data)
+            except Exception:
+                metrics["errors"] += 1
+                raise
+
+    @asynccontextmanager
+    async def slot(self, tenant: Tenant) -> AsyncIterator[None]:
+        """Место среди одновременно обрабатываемых апдейтов бота"""
+        metrics = self.metrics[tenant.name]
+        semaphore = self._semaphores[tenant.name]
+        if semaphore.locked():
+            metrics["waited"] += 1
+        async with semaphore:
+            metrics["active"] += 1
+            started = time.perf_counter()
+            try:
+                yield
+            finally:
+                metrics["active"] -= 1
+                self._handle_time[tenant.name] += time.perf_counter() - started
+
+    def stats(self) -> dict[str, dict]:
+        result = {}
+        for name, metrics in self.metrics.items():
+            updates = metrics["updates"]
+            result[name] = {
+                **metrics,
+                "avg_ms": self._handle_time[name] / updates * 1000 if updates else 0.0,
+            }
+        return result
@@ -0,0 +1,103 @@
+import logging
+import os
+import time
+from collections import Counter, OrderedDict
+from contextlib import suppress
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from app.core.tenants import tenant_name
+
+logger = logging.getLogger(__name__)
+
+# Лимиты по классам обработчиков: "<класс>=<нажатий>/<секунд>,...".
+# Класс задаётся флагом обработчика flags={"throttle": "<класс>"}, без флага — default.
+THROTTLE_LIMITS = os.getenv("THROTTLE_LIMITS", "start=3/60,menu=5/60,start_test=3/60,default=30/10")
+# Сколько корзин держим в памяти максимум
+THROTTLE_MAX_BUCKETS = int(os.getenv("THROTTLE_MAX_BUCKETS", "50000"))
+
+THROTTLED_TEXT = "Слишком часто 🙂 Подожди немного и попробуй снова."
+
+
+def parse_limits(raw: str) -> dict[str, tuple[float, float]]:
+    """'menu=5/60' -> {'menu': (5.0, 60.0)}: ёмкость корзины и время её полного наполнения"""
+    limits = {}
+    for item in raw.split(","):
+        if "=" not in item:
+            continue
+        name, rate = item.split("=", 1)
+        capacity, period = rate.split("/", 1)
+        limits[name.strip()] = (float(capacity), float(period))
+    return limits
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Ограничение частоты по пользователю и классу обработчика (token bucket).
+    Регистрируется как inner middleware на dp.message и dp.callback_query,
+    чтобы видеть флаги выбранного обработчика.
+    Вежливый ответ отправляется не чаще раза за период лимита, остальные
+    лишние нажатия отбрасываются молча.
+    """
+
+    def __init__(self, limits: str = THROTTLE_LIMITS, max_buckets: int = THROTTLE_MAX_BUCKETS) -> None:
+        self.limits = parse_limits(limits)
+        self.max_buckets = max_buckets
+        # (бот, user_id, класс) -> [токены, время последнего пополнения, время последнего предупреждения]
+        self._buckets: "OrderedDict[tuple[str, int, str], list[float]]" = OrderedDict()
+        self.throttled: Counter = Counter()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        name = get_flag(data, "throttle", default="default")
+        limit = self.limits.get(name) or self.limits.get("default")
+        if user is None or limit is None:
+            return await handler(event, data)
+
+        capacity, period = limit
+        now = time.monotonic()
+        key = (tenant_name(), user.id, name)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [capacity, now, 0.0]
+            self._buckets[key] = bucket
+            self._evict(now)
+        else:
+            bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * capacity / period)
+            bucket[1] = now
+            self._buckets.move_to_end(key)
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return await handler(event, data)
+
+        self.throttled[name] += 1
+        notify = now - bucket[2] >= period
+        if notify:
+            bucket[2] = now
+        with suppress(Exception):
+            if isinstance(event, CallbackQuery):
+                await event.answer(THROTTLED_TEXT if notify else None)
+            elif isinstance(event, Message) and notify:
+                await event.answer(THROTTLED_TEXT)
+        return None
+
+    def _evict(self, now: float) -> None:
+        """Удаляет простаивающие корзины (они уже полные) и держит размер в пределах max_buckets"""
+        longest_period = max(period for _, period in self.limits.values())
+        while self._buckets:
+            key, (_, touched, _) = next(iter(self._buckets.items()))
+            if now - touched < longest_period and len(self._buckets) <= self.max_buckets:
+                break
+            del self._buckets[key]
+
+    def stats(self) -> dict:
+        return {"buckets": len(self._buckets), "throttled": dict(self.throttled)}
@@ -0,0 +1,360 @@
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import time
+from contextlib import contextmanager
+from contextvars import Context, ContextVar, copy_context
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject, Update
+
+logger = logging.getLogger(__name__)
+
+# Куда писать спаны (одна строка JSON на трассу в формате OTLP/JSON) и когда ротировать файл
+TRACE_FILE = os.getenv("TRACE_FILE", "/data/traces/spans.jsonl")
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(20 * 1024 * 1024)))
+TRACE_BACKUP_COUNT = int(os.getenv("TRACE_BACKUP_COUNT", "5"))
+# Доля трасс, которые пишутся всегда (0..1)
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+# Трассы дольше порога (мс) пишутся независимо от выборки, 0 — выключить.
+# Нарочные паузы обработчиков (pause()) в длительность не входят
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "1000"))
+
+SERVICE_NAME = "psytest_tb"
+
+# Виды спанов из OTLP
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+STATUS_ERROR = 2
+
+
+class _Trace:
+    __slots__ = ("trace_id", "sampled", "spans", "exported", "paused")
+
+    def __init__(self, sampled: bool) -> None:
+        self.trace_id = os.urandom(16).hex()
+        self.sampled = sampled
+        self.spans: list[Span] = []
+        self.exported = False
+        # Сколько трасса провела в нарочных паузах (нс)
+        self.paused = 0
+
+
+class Span:
+    """Один участок работы: имя, время начала и конца, атрибуты и статус"""
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "start", "end", "attributes", "error")
+
+    def __init__(self, trace: _Trace, parent_id: Optional[str], name: str, kind: int, attributes: dict) -> None:
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.start = time.time_ns()
+        self.end = 0
+        self.error: Optional[str] = None
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start),
+            "endTimeUnixNano": str(self.end),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items() if v is not None],
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.error is not None:
+            span["status"] = {"code": STATUS_ERROR, "message": self.error}
+        return span
+
+
+def _otlp_attribute(key: str, value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+# Текущий спан: задачи asyncio и asyncio.to_thread получают копию контекста,
+# поэтому трасса апдейта сама доходит до обработчиков, БД и вызовов Bot API
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+# Трасса, из которой запущена фоновая задача: для link.trace_id её первого спана
+_linked_trace_id: ContextVar[Optional[str]] = ContextVar("linked_trace_id", default=None)
+
+_exporter: Optional["_SpanExporter"] = None
+
+
+class _PassThroughQueueHandler(QueueHandler):
+    """Кладёт в очередь запись как есть: JSON собирается уже в потоке записи"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class _OtlpFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(
+            {
+                "resourceSpans": [{
+                    "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+                    "scopeSpans": [{
+                        "scope": {"name": __name__},
+                        "spans": [span.to_otlp() for span in record.msg],
+                    }],
+                }]
+            },
+            ensure_ascii=False,
+        )
+
+
+class _SpanExporter:
+    """Пишет законченные трассы в ротируемый JSONL-файл из отдельного потока"""
+
+    def __init__(self, path: str, max_bytes: int, backup_count: int) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        file_handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        file_handler.setFormatter(_OtlpFormatter())
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._handler = _PassThroughQueueHandler(self._queue)
+        self._listener = QueueListener(self._queue, file_handler)
+        self._listener.start()
+        self.exported = 0
+
+    def export(self, spans: list[Span]) -> None:
+        self.exported += 1
+        self._handler.emit(logging.makeLogRecord({"msg": spans}))
+
+    def close(self) -> None:
+        self._listener.stop()
+        for handler in self._listener.handlers:
+            handler.close()
+
+
+def setup_tracing(
+    path: str = TRACE_FILE,
+    max_bytes: int = TRACE_MAX_BYTES,
+    backup_count: int = TRACE_BACKUP_COUNT,
+) -> bool:
+    """Включает запись трасс. Без выборки и порога медленных трасс ничего не делает"""
+    global _exporter
+    if TRACE_SAMPLE_RATE <= 0 and TRACE_SLOW_MS <= 0:
+        return False
+    _exporter = _SpanExporter(path, max_bytes, backup_count)
+    logger.info("Tracing to %s (sample rate %.3f, slow > %.0f ms)", path, TRACE_SAMPLE_RATE, TRACE_SLOW_MS)
+    return True
+
+
+def shutdown_tracing() -> None:
+    """Дописывает очередь трасс в файл и останавливает поток записи"""
+    global _exporter
+    if _exporter is not None:
+        _exporter.close()
+        _exporter = None
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current_span.get()
+    return current.trace_id if current is not None else None
+
+
+def detached_context() -> Context:
+    """
+    Контекст для фоновой задачи: копия текущего, но без текущего спана.
+    Иначе задача (реклама через сутки) держала бы в памяти спаны всей трассы апдейта;
+    остаётся только id трассы — для link.trace_id.
+    """
+    context = copy_context()
+    current = _current_span.get()
+    if current is not None:
+        context.run(_current_span.set, None)
+        context.run(_linked_trace_id.set, current.trace_id)
+    return context
+
+
+async def pause(seconds: float) -> None:
+    """
+    Нарочная пауза обработчика (asyncio.sleep), которая не делает трассу медленной:
+    её время вычитается при сравнении с TRACE_SLOW_MS
+    """
+    started = time.time_ns()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        current = _current_span.get()
+        if current is not None:
+            current.trace.paused += time.time_ns() - started
+
+
+def _finish(current: Span) -> None:
+    current.end = time.time_ns()
+    trace = current.trace
+    if _exporter is None:
+        return
+    if trace.exported:
+        # Спан фоновой задачи закончился позже корня — дописываем отдельно
+        _exporter.export([current])
+        return
+    trace.spans.append(current)
+    if current.parent_id is None:
+        busy = current.end - current.start - trace.paused
+        slow = TRACE_SLOW_MS > 0 and busy >= TRACE_SLOW_MS * 1_000_000
+        if trace.sampled or slow:
+            trace.exported = True
+            _exporter.export(trace.spans)
+
+
+@contextmanager
+def span(name: str, kind: int = KIND_INTERNAL, new_trace: bool = False, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Спан внутри текущей трассы. Вне трассы ничего не записывает и отдаёт None.
+    new_trace=True начинает новую трассу (апдейт, отложенная задача).
+    """
+    parent = _current_span.get()
+    if new_trace:
+        if _exporter is None:
+            yield None
+            return
+        sampled = random.random() < TRACE_SAMPLE_RATE
+        if not sampled and TRACE_SLOW_MS <= 0:
+            yield None
+            return
+        link = parent.trace_id if parent is not None else _linked_trace_id.get()
+        if link is not None:
+            attributes.setdefault("link.trace_id", link)
+        trace = _Trace(sampled)
+        parent_id = None
+    elif parent is None:
+        yield None
+        return
+    else:
+        trace = parent.trace
+        parent_id = parent.span_id
+
+    current = Span(trace, parent_id, name, kind, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        _finish(current)
+
+
+def traced(name: Optional[str] = None, **attributes: Any) -> Callable:
+    """Декоратор: вызов функции (обычной или async) — спан внутри текущей трассы"""
+
+    def decorator(func: Callable) -> Callable:
+        span_name = name or f"{func.__module__}.{func.__qualname__}"
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _current_span.get() is None:
+                    return await func(*args, **kwargs)
+                with span(span_name, **attributes):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with span(span_name, **attributes):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class UpdateTracingMiddleware(BaseMiddleware):
+    """Корневой спан на каждый апдейт. Регистрируется первым outer middleware на dp.update"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if _exporter is None or not isinstance(event, Update):
+            return await handler(event, data)
+
+        user = data.get("event_from_user")
+        attributes = {
+            "telegram.update_id": event.update_id,
+            "telegram.update_type": event.event_type,
+            "enduser.id": user.id if user else None,
+        }
+        if event.callback_query:
+            attributes["telegram.callback_data"] = event.callback_query.data
+        elif event.message and event.message.text and event.message.text.startswith("/"):
+            attributes["telegram.command"] = event.message.text.split()[0]
+
+        with span(f"update {event.event_type}", kind=KIND_SERVER, new_trace=True, **attributes):
+            return await handler(event, data)
+
+
+class HandlerTracingMiddleware(BaseMiddleware):
+    """Спан выбранного обработчика. Inner middleware на dp.message и dp.callback_query"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        if _current_span.get() is None or handler_object is None:
+            return await handler(event, data)
+
+        callback = handler_object.callback
+        with span(
+            f"handler {callback.__name__}",
+            **{"code.namespace": callback.__module__, "code.function": callback.__name__},
+        ):
+            return await handler(event, data)
+
+
+class TracingRequestMiddleware(BaseRequestMiddleware):
+    """Спан на каждый вызов Bot API. Регистрируется через bot.session.middleware(...)"""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        if _current_span.get() is None:
+            return await make_request(bot, method)
+        with span(f"telegram {method.__api_method__}", kind=KIND_CLIENT, **{"rpc.method": method.__api_method__}):
+            return await make_request(bot, method)
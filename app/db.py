@@ -1,27 +1,105 @@
+import logging
+import os
+import re
 import sqlite3
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
 
-DB_PATH = "/data/bot.db"
+from app.core.tenants import get_tenant
+from app.core.tracing import traced
+from app.migrations import migrate
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.getenv("DB_PATH", "/data/bot.db")
+# Отдельный файл для архива неактивных пользователей
+ARCHIVE_DB_PATH = os.getenv("ARCHIVE_DB_PATH", "/data/archive.db")
+# Размер memory-mapped I/O для чтения БД (байт), 0 — выключить
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+
+def db_path() -> str:
+    """Файл БД текущего бота (у каждого бота в процессе своя БД)"""
+    tenant = get_tenant()
+    return tenant.db_path if tenant is not None and tenant.db_path else DB_PATH
+
+
+def archive_db_path() -> str:
+    tenant = get_tenant()
+    return tenant.archive_db_path if tenant is not None and tenant.archive_db_path else ARCHIVE_DB_PATH
+
+
+class _ThreadConnection(sqlite3.Connection):
+    """Соединение из кэша потока: close() не закрывает его, а только откатывает незавершённую транзакцию"""
+
+    def close(self) -> None:
+        if self.in_transaction:
+            self.rollback()
+
+
+# Соединения текущего потока по пути к БД (у каждого бота своя БД)
+_local = threading.local()
+
+
+def _open(path: Optional[str] = None, factory: type = sqlite3.Connection) -> sqlite3.Connection:
+    """Открывает новое соединение с БД с настройками, которые действуют только на соединение"""
+    conn = sqlite3.connect(path or db_path(), factory=factory)
+    conn.execute("PRAGMA synchronous = NORMAL")  # в режиме WAL это безопасно и намного быстрее
+    conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+    conn.execute("PRAGMA busy_timeout = 5000")
+    return conn
+
+
+def _connect() -> sqlite3.Connection:
+    """
+    Соединение потока с БД текущего бота: открывается один раз на поток и путь,
+    чтобы точечные запросы не платили за открытие файла и PRAGMA на каждый вызов
+    """
+    path = db_path()
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        conn = connections[path] = _open(path, _ThreadConnection)
+    elif conn.in_transaction:
+        # Прошлый вызов в этом потоке упал посреди транзакции
+        conn.rollback()
+    return conn
 
 
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            telegram_id INTEGER UNIQUE,
-            username TEXT,
-            first_name TEXT,
-            last_name TEXT,
-            created_at TEXT,
-            promo_sent INTEGER DEFAULT 0,
-            score INTEGER DEFAULT 0
-        );
-        """
-    )
-    conn.commit()
+    os.makedirs(os.path.dirname(db_path()) or ".", exist_ok=True)
+    conn = _open()
+    # WAL сохраняется в самом файле БД, достаточно включить один раз
+    conn.execute("PRAGMA journal_mode = WAL")
+    migrate(conn)
     conn.close()
+    # До начала polling: полный VACUUM держит блокировку записи, пока не пройдёт всю БД
+    if enable_incremental_vacuum():
+        logger.info("Switched %s to auto_vacuum=INCREMENTAL (one-off full VACUUM)", db_path())
+
+
+@traced("db.warm_up")
+def warm_up() -> int:
+    """
+    Первый запрос после старта: читает индекс users в кэш страниц ОС, чтобы первые пользователи
+    не ждали холодного диска. Кэш ОС общий, поэтому можно выполнять в отдельном потоке
+    """
+    conn = _connect()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def open_connection() -> None:
+    """
+    Открывает соединение текущего потока заранее: обработчики работают с БД из потока
+    цикла событий, и первый апдейт не должен платить за открытие файла, PRAGMA и чтение схемы
+    """
+    _connect().execute("SELECT 1 FROM users LIMIT 1").fetchone()
 
 
 def save_user(message):
@@ -29,28 +107,57 @@ def save_user(message):
     save_user_from_user(message.from_user)
 
 
-def save_user_from_user(user):
-    """Сохраняет пользователя из объекта User (from aiogram.types.User)."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute(
+@traced("db.save_user_from_user")
+def save_user_from_user(user, test_started: bool = False) -> bool:
+    """
+    Сохраняет пользователя из объекта User (from aiogram.types.User).
+    test_started=True — в той же транзакции учитывает начало теста в статистике
+    и отмечает первое начало теста. Возвращает True, если пользователь начал тест впервые.
+    """
+    now = datetime.utcnow().isoformat()
+    conn = _connect()
+    cur = conn.execute(
         """
-        INSERT OR IGNORE INTO users (telegram_id, username, first_name, last_name, created_at)
-        VALUES (?, ?, ?, ?, ?)
+        INSERT OR IGNORE INTO users (telegram_id, username, first_name, last_name, created_at, last_active_at)
+        VALUES (?, ?, ?, ?, ?, ?)
         """,
         (
             user.id,
             user.username,
             user.first_name,
             user.last_name,
-            datetime.utcnow().isoformat(),
+            now,
+            now,
         ),
     )
+    inserted = cur.rowcount == 1
+    if not inserted:
+        conn.execute("UPDATE users SET last_active_at = ? WHERE telegram_id = ?", (now, user.id))
+    elif os.path.exists(archive_db_path()):
+        # Вернулся пользователь из архива: переносим его отметки (ATTACH — только вне транзакции)
+        conn.commit()
+        _restore_archived(conn, user.id)
+
+    first_test = False
+    if test_started:
+        conn.execute(
+            """
+            INSERT INTO daily_stats (day, tests_started) VALUES (date('now'), 1)
+            ON CONFLICT(day) DO UPDATE SET tests_started = tests_started + 1
+            """
+        )
+        first_test = conn.execute(
+            "UPDATE users SET test_started_at = ? WHERE telegram_id = ? AND test_started_at IS NULL",
+            (now, user.id),
+        ).rowcount == 1
     conn.commit()
     conn.close()
+    return first_test
 
 
+@traced("db.mark_promo_sent")
 def mark_promo_sent(telegram_id: int):
-    conn = sqlite3.connect(DB_PATH)
+    conn = _connect()
     conn.execute(
         "UPDATE users SET promo_sent = 1 WHERE telegram_id = ?", # promo_sent = 1
         (telegram_id,),
@@ -59,8 +166,9 @@ def mark_promo_sent(telegram_id: int):
     conn.close()
 
 
+@traced("db.is_promo_sent")
 def is_promo_sent(telegram_id: int) -> bool:
-    conn = sqlite3.connect(DB_PATH)
+    conn = _connect()
     cur = conn.execute(
         "SELECT promo_sent FROM users WHERE telegram_id = ?",
         (telegram_id,),
@@ -70,8 +178,9 @@ def is_promo_sent(telegram_id: int) -> bool:
     return bool(row and row[0])
 
 
+@traced("db.get_user_first_name")
 def get_user_first_name(telegram_id: int) -> str:
-    conn = sqlite3.connect(DB_PATH)
+    conn = _connect()
     cur = conn.execute(
         "SELECT first_name FROM users WHERE telegram_id = ?",
         (telegram_id,),
@@ -85,9 +194,10 @@ def get_user_first_name(telegram_id: int) -> str:
 
 
 # В db.py добавляем функцию проверки
+@traced("db.user_exists")
 def user_exists(telegram_id: int) -> bool:
     """Проверяет, существует ли пользователь в БД"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute("SELECT 1 FROM users WHERE telegram_id = ?", (telegram_id,))
     exists = cursor.fetchone() is not None
@@ -95,25 +205,240 @@ def user_exists(telegram_id: int) -> bool:
     return exists
 
 
-def update_score(telegram_id: int, score: int):
-    with sqlite3.connect(DB_PATH) as con:
+@traced("db.update_score")
+def update_score(telegram_id: int, score: int, answers: Optional[str] = None):
+    """Итог теста; answers — коды выбранных вариантов по порядку вопросов (для офлайн-аналитики)"""
+    with _connect() as con:
         con.execute(
-            "UPDATE users SET score = ? WHERE telegram_id = ?",
-            (score, telegram_id),
+            "UPDATE users SET score = ?, answers = COALESCE(?, answers) WHERE telegram_id = ?",
+            (score, answers, telegram_id),
         )
         con.commit()
 
 
+@traced("db.get_recent_users")
 def get_recent_users(limit: int = 10) -> list[tuple]:
     """
     Получает последних N пользователей, отсортированных по дате создания (новые первые)
     Возвращает список кортежей: (telegram_id, username, first_name, last_name, created_at, score)
     """
-    conn = sqlite3.connect(DB_PATH)
+    conn = _connect()
     cur = conn.execute(
         "SELECT telegram_id, username, first_name, last_name, created_at, score FROM users ORDER BY created_at DESC LIMIT ?",
         (limit,),
     )
     users = cur.fetchall()
     conn.close()
-    return users
\ No newline at end of file
+    return users
+
+
+@traced("db.search_users")
+def search_users(query: str, limit: int = 10, offset: int = 0) -> list[tuple]:
+    """
+    Ищет пользователей по username, имени или фамилии (по началу слов, без учёта регистра).
+    Все слова запроса должны найтись. Новые пользователи первыми.
+    Возвращает список кортежей: (telegram_id, username, first_name, last_name, created_at, score)
+    """
+    # Разбиваем так же, как токенизатор FTS: «_», «@» и пробелы — разделители
+    terms = re.findall(r"[^\W_]+", query.replace("ё", "е").replace("Ё", "Е"))
+    if not terms:
+        return []
+    match = " ".join(f'"{term}"*' for term in terms)
+
+    conn = _connect()
+    cur = conn.execute(
+        """
+        SELECT u.telegram_id, u.username, u.first_name, u.last_name, u.created_at, u.score
+        FROM users_fts f JOIN users u ON u.id = f.rowid
+        WHERE users_fts MATCH ?
+        ORDER BY f.rowid DESC
+        LIMIT ? OFFSET ?
+        """,
+        (match, limit, offset),
+    )
+    users = cur.fetchall()
+    conn.close()
+    return users
+
+
+@traced("db.get_stats")
+def get_stats(days: int = 7) -> dict:
+    """
+    Сводка для админа из счётчиков (без прохода по users):
+    totals — (new_users, tests_started, tests_finished) за всё время,
+    daily — [(day, new_users, tests_started, tests_finished)] за последние days дней (новые первые),
+    histogram — [(score, users)] по текущим результатам пользователей.
+    """
+    conn = _connect()
+    totals = conn.execute(
+        "SELECT COALESCE(SUM(new_users), 0), COALESCE(SUM(tests_started), 0), COALESCE(SUM(tests_finished), 0) "
+        "FROM daily_stats"
+    ).fetchone()
+    daily = conn.execute(
+        "SELECT day, new_users, tests_started, tests_finished FROM daily_stats ORDER BY day DESC LIMIT ?",
+        (days,),
+    ).fetchall()
+    histogram = conn.execute("SELECT score, users FROM score_histogram WHERE users > 0 ORDER BY score").fetchall()
+    conn.close()
+    return {"totals": totals, "daily": daily, "histogram": histogram}
+
+
+def _attach_archive(conn: sqlite3.Connection) -> None:
+    # Соединение переиспользуется: архив мог остаться подключённым после ошибки
+    if any(row[1] == "archive" for row in conn.execute("PRAGMA database_list")):
+        return
+    conn.execute("ATTACH DATABASE ? AS archive", (archive_db_path(),))
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS archive.users_archive (
+            telegram_id INTEGER PRIMARY KEY,
+            username TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            created_at TEXT,
+            promo_sent INTEGER DEFAULT 0,
+            score INTEGER DEFAULT 0,
+            last_active_at TEXT,
+            archived_at TEXT,
+            test_started_at TEXT,
+            answers TEXT
+        )
+        """
+    )
+    # Архив, созданный до появления users.test_started_at и users.answers
+    columns = {row[1] for row in conn.execute("PRAGMA archive.table_info(users_archive)")}
+    for column in ("test_started_at", "answers"):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE archive.users_archive ADD COLUMN {column} TEXT")
+
+
+def _restore_archived(conn: sqlite3.Connection, telegram_id: int) -> None:
+    """
+    Пользователь вернулся из архива: переносит результат и ответы последнего теста, отметку о рекламе,
+    дату первого прихода и первого начала теста, убирает архивную запись.
+    Статистика его уже учитывает (архивные пользователи остаются в счётчиках), поэтому
+    повторную вставку из new_users вычитаем, а учёт восстановленного результата триггером отменяем.
+    """
+    _attach_archive(conn)
+    row = conn.execute(
+        """
+        SELECT promo_sent, score, created_at, test_started_at, answers
+        FROM archive.users_archive WHERE telegram_id = ?
+        """,
+        (telegram_id,),
+    ).fetchone()
+    if row is not None:
+        promo_sent, score, created_at, test_started_at, answers = row
+        conn.execute(
+            """
+            UPDATE daily_stats SET new_users = new_users - 1
+            WHERE day = (SELECT substr(created_at, 1, 10) FROM users WHERE telegram_id = ?) AND new_users > 0
+            """,
+            (telegram_id,),
+        )
+        conn.execute(
+            """
+            UPDATE users SET promo_sent = ?, created_at = COALESCE(?, created_at), test_started_at = ?,
+                score = ?, answers = ?
+            WHERE telegram_id = ?
+            """,
+            # Архивы до test_started_at: начинавшими считаем тех, у кого есть результат
+            (promo_sent, created_at, test_started_at or (created_at if score else None), score or 0, answers,
+             telegram_id),
+        )
+        if score and score > 0:
+            # stats_test_finished посчитал восстановление результата новым прохождением
+            conn.execute(
+                "UPDATE daily_stats SET tests_finished = tests_finished - 1 WHERE day = date('now') AND tests_finished > 0"
+            )
+            conn.execute("UPDATE score_histogram SET users = users - 1 WHERE score = ? AND users > 0", (score,))
+        conn.execute("DELETE FROM archive.users_archive WHERE telegram_id = ?", (telegram_id,))
+    conn.commit()
+    conn.execute("DETACH DATABASE archive")
+
+
+@traced("db.archive_inactive_users")
+def archive_inactive_users(max_age_days: int, batch_size: int = 1000) -> int:
+    """
+    Переносит одну порцию пользователей, неактивных дольше max_age_days, в архивную БД.
+    Возвращает количество перенесённых (0 — переносить больше нечего).
+    Счётчики статистики не меняются: архивные пользователи в них остаются
+    (если пользователь вернётся, _restore_archived не посчитает его второй раз).
+    """
+    cutoff = (datetime.utcnow() - timedelta(days=max_age_days)).isoformat()
+    conn = _connect()
+    _attach_archive(conn)
+    ids = [
+        row[0]
+        for row in conn.execute(
+            "SELECT id FROM users WHERE last_active_at < ? LIMIT ?",
+            (cutoff, batch_size),
+        )
+    ]
+    if ids:
+        placeholders = ", ".join("?" * len(ids))
+        # Сначала пишем в архив (идемпотентно), потом удаляем из рабочей таблицы
+        conn.execute(
+            f"""
+            INSERT OR REPLACE INTO archive.users_archive
+                (telegram_id, username, first_name, last_name, created_at, promo_sent, score, last_active_at,
+                 archived_at, test_started_at, answers)
+            SELECT telegram_id, username, first_name, last_name, created_at, promo_sent, score, last_active_at,
+                ?, test_started_at, answers
+            FROM users WHERE id IN ({placeholders})
+            """,
+            (datetime.utcnow().isoformat(), *ids),
+        )
+        conn.execute(f"DELETE FROM users WHERE id IN ({placeholders})", ids)
+        conn.commit()
+    conn.execute("DETACH DATABASE archive")
+    conn.close()
+    return len(ids)
+
+
+def enable_incremental_vacuum() -> bool:
+    """
+    Включает auto_vacuum=INCREMENTAL. Для уже существующей БД это требует одного полного VACUUM.
+    Возвращает True, если пришлось его выполнить.
+    """
+    conn = _open()
+    mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    if mode == 2:
+        conn.close()
+        return False
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    conn.close()
+    return True
+
+
+@traced("db.incremental_vacuum_step")
+def incremental_vacuum_step(pages: int) -> int:
+    """Возвращает системе до pages свободных страниц. Возвращает, сколько свободных осталось"""
+    conn = _connect()
+    conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+    conn.commit()
+    remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    conn.close()
+    return remaining
+
+
+@traced("db.get_db_size")
+def get_db_size() -> dict:
+    """Размер рабочей и архивной БД: байты на диске и страницы"""
+    conn = _connect()
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    conn.close()
+
+    def file_size(path: str) -> int:
+        return sum(os.path.getsize(p) for p in (path, f"{path}-wal") if os.path.exists(p))
+
+    return {
+        "page_size": page_size,
+        "page_count": page_count,
+        "freelist_count": freelist,
+        "db_bytes": file_size(db_path()),
+        "archive_bytes": file_size(archive_db_path()),
+    }
\ No newline at end of file
@@ -1,4 +1,5 @@
 import random
+from functools import lru_cache
 
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
@@ -6,11 +7,13 @@ from app.questions import QUESTIONS
 
 LETTERS = ["А", "Б", "В", "Г"]
 RESULT_PAGE_CB_PREFIX = "result_more:"
+ADMIN_SEARCH_CB_PREFIX = "admin_search:"
 
 
+@lru_cache(maxsize=None)
 def build_menu_inline(is_admin: bool = False) -> InlineKeyboardMarkup:
     """
-    Инлайн-меню под сообщением
+    Инлайн-меню под сообщением. Клавиатуры без переменных частей строятся один раз
     """
     keyboard = [
         [
@@ -26,6 +29,16 @@ def build_menu_inline(is_admin: bool = False) -> InlineKeyboardMarkup:
             InlineKeyboardButton(
                 text="📊 Последние пользователи",
                 callback_data="admin_recent_users",
+            ),
+            InlineKeyboardButton(
+                text="📈 Статистика",
+                callback_data="admin_stats",
+            ),
+        ])
+        keyboard.append([
+            InlineKeyboardButton(
+                text="🔎 Поиск пользователей",
+                callback_data="admin_search_help",
             )
         ])
     
@@ -58,7 +71,7 @@ def build_question_text_and_kb(q_index: int) -> tuple[str, InlineKeyboardMarkup]
         [
             InlineKeyboardButton(
                 text=LETTERS[i],
-                callback_data=f"answer:{opt.points}",
+                callback_data=f"answer:{q_index}:{opt.points}",
             )
         ]
         for i, opt in enumerate(options)
@@ -68,6 +81,7 @@ def build_question_text_and_kb(q_index: int) -> tuple[str, InlineKeyboardMarkup]
     return text, kb
 
 
+@lru_cache(maxsize=None)
 def build_result_more_kb(next_page: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         inline_keyboard=[
@@ -80,3 +94,17 @@ def build_result_kb_for_page(page: int, total_pages: int) -> InlineKeyboardMarku
     if page >= total_pages - 1:
         return None
     return build_result_more_kb(page + 1)
+
+
+def build_search_pages_kb(page: int, has_next: bool) -> InlineKeyboardMarkup | None:
+    """
+    Кнопки листания результатов поиска пользователей (для админа)
+    """
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton(text="◀", callback_data=f"{ADMIN_SEARCH_CB_PREFIX}{page - 1}"))
+    if has_next:
+        buttons.append(InlineKeyboardButton(text="▶", callback_data=f"{ADMIN_SEARCH_CB_PREFIX}{page + 1}"))
+    if not buttons:
+        return None
+    return InlineKeyboardMarkup(inline_keyboard=[buttons])
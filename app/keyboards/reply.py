@@ -1,5 +1,8 @@
+from functools import lru_cache
+
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 
+@lru_cache(maxsize=None)
 def get_main_keyboard() -> ReplyKeyboardMarkup:
     """
     Нижняя большая кнопка "Меню"
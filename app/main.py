@@ -1,15 +1,37 @@
 import asyncio
 import logging
-import os
 import sys
 
+# Первым из модулей бота: отсчёт вех запуска и (STARTUP_PROFILE=1) замер импорта aiogram и роутеров
+from app.core.startup import STARTUP_PROFILE, startup
+
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 
+from app.backup import backup_loop
 from app.db import init_db
+from app.retention import retention_loop
 from app.routers import start, menu, test, admin
+from app.warmup import warm_up
+from app.core.executor import UserSerialMiddleware
+from app.core.health import health
+from app.core.http import PooledAiohttpSession
 from app.core.logging import setup_telegram_logging, start_telegram_logging_handler
+from app.core.recorder import RECORD_UPDATES_DIR, UpdateRecorderMiddleware
+from app.core.throttling import ThrottlingMiddleware
+from app.core.tracing import (
+    HandlerTracingMiddleware,
+    TracingRequestMiddleware,
+    UpdateTracingMiddleware,
+    setup_tracing,
+    shutdown_tracing,
+)
+from app.core.tasks import supervisor
+from app.core.tenants import TENANTS, TenantMiddleware, load_tenants, use_tenant
+from app.core.shutdown import InFlightMiddleware, graceful_shutdown, restore_state
+
+startup.mark("imports")
 
 logging.basicConfig(
     level=logging.INFO,
@@ -20,16 +42,74 @@ logging.basicConfig(
 ERROR_CHAT_ID = 905551789
 
 
-async def main() -> None:
-    token = os.getenv("BOT_TOKEN")
-    if not token:
-        raise RuntimeError("Не задан BOT_TOKEN в переменных окружения")
-
-    bot = Bot(token=token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+def build_dispatcher() -> Dispatcher:
+    """
+    Dispatcher со всеми роутерами и middleware.
+    Используется и ботом, и инструментом воспроизведения app/tools/replay.py.
+    """
     dp = Dispatcher()
 
+    # Трасса на каждый апдейт (выборка TRACE_SAMPLE_RATE и медленные апдейты): первым, чтобы учесть всю цепочку
+    dp.update.outer_middleware(UpdateTracingMiddleware())
+
+    # Время от старта процесса до первого обработанного апдейта
+    dp.update.outer_middleware(startup)
+
+    # Бот по токену апдейта: его БД, админ и состояние (лимит одновременных апдейтов бота берёт executor)
+    dp["tenancy"] = TenantMiddleware(TENANTS)
+    dp.update.outer_middleware(dp["tenancy"])
+
+    # Запись входящих апдейтов для офлайн-воспроизведения (включается RECORD_UPDATES_DIR)
+    if RECORD_UPDATES_DIR:
+        dp["recorder"] = UpdateRecorderMiddleware(RECORD_UPDATES_DIR)
+        dp.update.outer_middleware(dp["recorder"])
+
+    # Учёт активных обработчиков для упорядоченной остановки по SIGTERM
+    dp["in_flight"] = InFlightMiddleware()
+    dp.update.outer_middleware(dp["in_flight"])
+
+    # Время последнего успешно обработанного апдейта для /health
+    dp.update.outer_middleware(health)
+
+    # Апдейты одного пользователя — по очереди, разных — параллельно; дубли нажатий отбрасываем
+    dp["executor"] = UserSerialMiddleware()
+    dp.update.outer_middleware(dp["executor"])
+
+    # Спан выбранного обработчика внутри трассы апдейта
+    dp.message.middleware(HandlerTracingMiddleware())
+    dp.callback_query.middleware(HandlerTracingMiddleware())
+
+    # Ограничение частоты нажатий по пользователю и классу обработчика (флаг "throttle")
+    dp["throttling"] = ThrottlingMiddleware()
+    dp.message.middleware(dp["throttling"])
+    dp.callback_query.middleware(dp["throttling"])
+
+    dp.include_router(start.router)
+    dp.include_router(menu.router)
+    dp.include_router(test.router)
+    dp.include_router(admin.router)
+    return dp
+
+
+async def main() -> None:
+    # Все боты и все отправки (ответы, фото, уведомления, логи, реклама) идут через один настроенный пул соединений;
+    # каждый вызов Bot API внутри трассы — отдельный спан
+    session = PooledAiohttpSession()
+    session.middleware(TracingRequestMiddleware())
+    bots = {
+        tenant.name: Bot(
+            token=tenant.bot_token,
+            session=session,
+            default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+        )
+        for tenant in TENANTS
+    }
+    setup_tracing()
+    dp = build_dispatcher()
+    startup.mark("dispatcher")
+
     # Настраиваем отправку ошибок в Telegram
-    telegram_handler = setup_telegram_logging(bot, ERROR_CHAT_ID, level=logging.ERROR)
+    telegram_handler = setup_telegram_logging(next(iter(bots.values())), ERROR_CHAT_ID, level=logging.ERROR)
     await start_telegram_logging_handler(telegram_handler)
 
     # Обработчик необработанных исключений
@@ -46,20 +126,65 @@ async def main() -> None:
     
     sys.excepthook = handle_exception
 
-    dp.include_router(start.router)
-    dp.include_router(menu.router)
-    dp.include_router(test.router)
-    dp.include_router(admin.router)
+    # Периодические задачи: если цикл всё же упал, supervisor перезапустит его
+    supervisor.group("maintenance", retries=None, retry_delay=60.0)
+    # Очистка брошенных сессий теста
+    supervisor.spawn("maintenance", test.sweep_sessions)
+    # Перенос неактивных пользователей в архив и сжатие БД
+    supervisor.spawn("maintenance", retention_loop)
+    # Резервные копии БД (online backup API, без остановки бота)
+    supervisor.spawn("maintenance", backup_loop)
+
+    async def on_shutdown() -> None:
+        health.mark_stopping()
+        supervisor.cancel_group("maintenance")
+        await graceful_shutdown(dp["in_flight"], telegram_handler)
+        if "recorder" in dp.workflow_data:
+            dp["recorder"].close()
+        shutdown_tracing()
+        await health.stop()
+
+    dp.shutdown.register(on_shutdown)
+
+    async def on_startup() -> None:
+        logging.info("Polling starts %.2fs after process start", startup.mark("start_polling"))
+        startup.disable_import_timing()
+        if STARTUP_PROFILE:
+            logging.info("Startup profile:\n%s", startup.report())
+
+    dp.startup.register(on_startup)
+
+    # Проверка здоровья поднимается до прогрева: /health сразу отвечает, /ready — после первого getUpdates
+    health.watch_polling({name: bot.id for name, bot in bots.items()}, session.last_poll)
+    health.add_queue("in_flight", lambda: dp["in_flight"].count)
+    health.add_queue("users_queued", lambda: dp["executor"].stats()["users_queued"])
+    health.add_queue("tenants_active", lambda: {name: m["active"] for name, m in dp["tenancy"].metrics.items()})
+    health.add_queue("telegram_log", telegram_handler.pending)
+    health.add_metrics("executor", dp["executor"].stats)
+    health.add_metrics("throttling", dp["throttling"].stats)
+    health.add_metrics("bot_api", session.stats)
+    await health.start()
+
+    # Возвращаем сессии, таймеры рекламы и file_id картинок, сохранённые при прошлой остановке
+    restore_state(bots)
+    startup.mark("restore_state")
+
+    # Прогрев до первого апдейта: БД, кэши текстов и клавиатур, getMe, file_id картинок
+    health.mark_ready(await warm_up(bots))
+    startup.mark("warm-up")
 
-    logging.info("Bot started")
+    logging.info("Bot started: %s", ", ".join(bots))
     try:
-        await dp.start_polling(bot)
+        await dp.start_polling(*bots.values())
     except Exception as e:
         logging.critical(f"Critical error in bot: {e}", exc_info=True)
         raise
 
 
 if __name__ == "__main__":
-    init_db()
+    for tenant in load_tenants():
+        with use_tenant(tenant):
+            init_db()
+    startup.mark("init_db")
     asyncio.run(main())
  
\ No newline at end of file
@@ -0,0 +1,194 @@
+import logging
+import sqlite3
+from typing import Callable, Union
+
+logger = logging.getLogger(__name__)
+
+# Поля пользователя, по которым работает полнотекстовый поиск админа
+FTS_COLUMNS = ("username", "first_name", "last_name")
+
+
+def _fts_values(prefix: str) -> str:
+    """Значения для users_fts: «ё» приводим к «е», чтобы искать как пишут люди"""
+    return ", ".join(f"replace(replace({prefix}.{col}, 'ё', 'е'), 'Ё', 'Е')" for col in FTS_COLUMNS)
+
+
+_FTS_INSERT = f"INSERT INTO users_fts (rowid, {', '.join(FTS_COLUMNS)}) VALUES (new.id, {_fts_values('new')});"
+
+
+# Шаг миграции: SQL-запрос или функция, получающая соединение (для переноса данных)
+Step = Union[str, Callable[[sqlite3.Connection], None]]
+
+# Упорядоченный список миграций: (версия, описание, шаги).
+# Уже применённые миграции не меняем — только добавляем новые в конец.
+MIGRATIONS: list[tuple[int, str, list[Step]]] = [
+    (
+        1,
+        "users table",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                telegram_id INTEGER UNIQUE,
+                username TEXT,
+                first_name TEXT,
+                last_name TEXT,
+                created_at TEXT,
+                promo_sent INTEGER DEFAULT 0,
+                score INTEGER DEFAULT 0
+            )
+            """,
+        ],
+    ),
+    (
+        2,
+        "index on users.created_at",
+        [
+            "CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at)",
+        ],
+    ),
+    (
+        3,
+        "full-text search over user names (users_fts)",
+        [
+            # unicode61 без учёта регистра (включая кириллицу); prefix ускоряет поиск по началу слова
+            f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+                {', '.join(FTS_COLUMNS)},
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+            """,
+            f"""
+            CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN
+                {_FTS_INSERT}
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN
+                DELETE FROM users_fts WHERE rowid = old.id;
+            END
+            """,
+            f"""
+            CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE OF {', '.join(FTS_COLUMNS)} ON users BEGIN
+                DELETE FROM users_fts WHERE rowid = old.id;
+                {_FTS_INSERT}
+            END
+            """,
+            f"INSERT INTO users_fts (rowid, {', '.join(FTS_COLUMNS)}) SELECT id, {_fts_values('users')} FROM users",
+        ],
+    ),
+    (
+        4,
+        "incremental statistics (daily_stats, score_histogram)",
+        [
+            # Счётчики по дням (UTC, как created_at); обновляются в той же транзакции, что и запись в users
+            """
+            CREATE TABLE IF NOT EXISTS daily_stats (
+                day TEXT PRIMARY KEY,
+                new_users INTEGER NOT NULL DEFAULT 0,
+                tests_started INTEGER NOT NULL DEFAULT 0,
+                tests_finished INTEGER NOT NULL DEFAULT 0
+            )
+            """,
+            # Сколько пользователей с каждым текущим результатом (по последнему прохождению)
+            """
+            CREATE TABLE IF NOT EXISTS score_histogram (
+                score INTEGER PRIMARY KEY,
+                users INTEGER NOT NULL DEFAULT 0
+            )
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS daily_stats_new_user AFTER INSERT ON users BEGIN
+                INSERT INTO daily_stats (day, new_users)
+                VALUES (COALESCE(substr(new.created_at, 1, 10), date('now')), 1)
+                ON CONFLICT(day) DO UPDATE SET new_users = new_users + 1;
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS stats_test_finished AFTER UPDATE OF score ON users
+            WHEN new.score > 0 BEGIN
+                INSERT INTO daily_stats (day, tests_finished) VALUES (date('now'), 1)
+                ON CONFLICT(day) DO UPDATE SET tests_finished = tests_finished + 1;
+                UPDATE score_histogram SET users = users - 1 WHERE score = old.score AND old.score > 0;
+                INSERT INTO score_histogram (score, users) VALUES (new.score, 1)
+                ON CONFLICT(score) DO UPDATE SET users = users + 1;
+            END
+            """,
+            # Заполняем по уже накопленным данным (начатые/завершённые тесты по дням раньше не хранились)
+            """
+            INSERT OR REPLACE INTO daily_stats (day, new_users)
+            SELECT substr(created_at, 1, 10), COUNT(*) FROM users
+            WHERE created_at IS NOT NULL GROUP BY substr(created_at, 1, 10)
+            """,
+            """
+            INSERT OR REPLACE INTO score_histogram (score, users)
+            SELECT score, COUNT(*) FROM users WHERE score > 0 GROUP BY score
+            """,
+        ],
+    ),
+    (
+        5,
+        "users.last_active_at for archiving inactive users",
+        [
+            "ALTER TABLE users ADD COLUMN last_active_at TEXT",
+            "UPDATE users SET last_active_at = created_at",
+            "CREATE INDEX IF NOT EXISTS idx_users_last_active_at ON users(last_active_at)",
+        ],
+    ),
+    (
+        6,
+        "users.answers: option codes of the last finished test",
+        [
+            # Строка кодов вариантов по порядку вопросов, например "abdcbaa"; до этой версии ответы не хранились
+            "ALTER TABLE users ADD COLUMN answers TEXT",
+        ],
+    ),
+    (
+        7,
+        "users.test_started_at: first test start",
+        [
+            # До этой версии начало теста не хранилось: начинавшими считаем тех, у кого есть результат
+            "ALTER TABLE users ADD COLUMN test_started_at TEXT",
+            "UPDATE users SET test_started_at = created_at WHERE score > 0",
+        ],
+    ),
+]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Применяет недостающие миграции. Каждая миграция — в своей транзакции:
+    при ошибке она откатывается целиком, версия схемы не меняется.
+    Возвращает итоговую версию схемы.
+    """
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None  # транзакциями управляем сами
+    try:
+        current = get_schema_version(conn)
+        for version, description, steps in MIGRATIONS:
+            if version <= current:
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for step in steps:
+                    if callable(step):
+                        step(conn)
+                    else:
+                        conn.execute(step)
+                conn.execute("INSERT INTO schema_version (version) VALUES (?)", (version,))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            logger.info("Applied migration %d: %s", version, description)
+            current = version
+        return current
+    finally:
+        conn.isolation_level = isolation_level
@@ -1,15 +1,53 @@
 # promo.py
-import asyncio
+import os
+import time
 from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from app.core.tasks import supervisor
+from app.core.tenants import TenantLocal, get_tenant
+from app.core.tracing import span
 from app.db import is_promo_sent, mark_promo_sent, get_user_first_name
 
 PROMO_DELAY_SECONDS = 24 * 60 * 60  # 24 часа
+# Сколько реклам отправляется одновременно (например, когда после перезапуска подошло время у многих)
+PROMO_CONCURRENCY = int(os.getenv("PROMO_CONCURRENCY", "5"))
+# Сколько отложенных реклам может ждать в памяти
+PROMO_MAX_PENDING = int(os.getenv("PROMO_MAX_PENDING", "100000"))
+
+# Отложенные рекламы: telegram_id -> (chat_id, unix-время отправки).
+# Сохраняются при остановке бота и восстанавливаются при старте. У каждого бота свои.
+PENDING_PROMOS: TenantLocal = TenantLocal(dict)
+
+# Сетевые сбои и перегрузка Telegram — повод повторить, остальные ошибки — нет
+supervisor.group(
+    "promo",
+    limit=PROMO_CONCURRENCY,
+    max_pending=PROMO_MAX_PENDING,
+    retries=3,
+    retry_on=(TelegramNetworkError, TelegramServerError, TelegramRetryAfter),
+    retry_delay=30.0,
+)
+
+
+def start_promo(bot: Bot, chat_id: int, telegram_id: int, delay: float = PROMO_DELAY_SECONDS) -> None:
+    """Запускает фоновую задачу с отложенной рекламой"""
+    # Уже ждёт своей очереди: отправится всё равно только первая реклама
+    if telegram_id in PENDING_PROMOS:
+        return
+    if supervisor.spawn("promo", schedule_promo, bot, chat_id, telegram_id, delay=delay) is not None:
+        PENDING_PROMOS[telegram_id] = (chat_id, time.time() + delay)
 
 
 async def schedule_promo(bot: Bot, chat_id: int, telegram_id: int):
-    # Ждём 24 часа
-    await asyncio.sleep(PROMO_DELAY_SECONDS)
+    """Отправка рекламы, когда подошло время (задержку выдерживает supervisor)"""
+    PENDING_PROMOS.pop(telegram_id, None)
+
+    # Своя трасса: апдейт, запустивший таймер, давно закончился (его trace_id — в link.trace_id)
+    with span("promo.send", new_trace=True, **{"enduser.id": telegram_id}):
+        await _send_promo(bot, chat_id, telegram_id)
+
 
+async def _send_promo(bot: Bot, chat_id: int, telegram_id: int):
     # Перед отправкой ещё раз проверяем, не отправляли ли рекламу
     if is_promo_sent(telegram_id):
         return
@@ -34,11 +72,18 @@ async def schedule_promo(bot: Bot, chat_id: int, telegram_id: int):
         "С теплом и уважением,\n"
         "Марина Червакова."
     )
+    # Свой текст у бота другого психолога (задаётся в TENANTS_FILE)
+    tenant = get_tenant()
+    if tenant is not None and tenant.promo_text:
+        text = tenant.promo_text.format(first_name=first_name)
 
 
     try:
         await bot.send_message(chat_id, text)
         mark_promo_sent(telegram_id)
+    except (TelegramNetworkError, TelegramServerError, TelegramRetryAfter):
+        # Повторит supervisor
+        raise
     except Exception:
         # тут можно залогировать ошибку, если хочешь
         pass
@@ -237,6 +237,25 @@ P.S. Помни эти телефоны (Россия):
     return f"{text}"
 
 
+# Верхние границы баллов уровней (те же, что в interpret_score) и подписи к ним
+LEVELS: List[tuple] = [
+    (17, "ЗЕЛЕНЫЙ УРОВЕНЬ"),
+    (34, "ЖЕЛТЫЙ УРОВЕНЬ"),
+    (52, "КРАСНЫЙ УРОВЕНЬ"),
+    (None, "МИГАЮЩИЙ КРАСНЫЙ"),
+]
+
+
+def get_level_name(score: int) -> str:
+    """
+    Возвращает краткое название уровня для подписи к фото и статистики.
+    """
+    for upper, name in LEVELS:
+        if upper is None or score <= upper:
+            return name
+    return LEVELS[-1][1]
+
+
 def get_result_image_name(score: int) -> str:
     """
     Возвращает имя файла картинки для результата.
@@ -0,0 +1,62 @@
+import asyncio
+import logging
+import os
+
+from app.core.tenants import all_tenants, tenant_name, use_tenant
+from app.db import archive_inactive_users, get_db_size, incremental_vacuum_step
+
+logger = logging.getLogger(__name__)
+
+# Через сколько дней без активности пользователь уходит в архив
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+# Как часто запускать архивацию (сек)
+RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL", str(24 * 60 * 60)))
+# Размер порции: пользователей за одну транзакцию и страниц за один шаг vacuum
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+VACUUM_STEP_PAGES = int(os.getenv("VACUUM_STEP_PAGES", "256"))
+# Пауза между порциями, чтобы не держать блокировку записи подолгу (сек)
+RETENTION_PAUSE = 0.05
+
+
+async def run_retention() -> dict:
+    """
+    Один проход: переносит неактивных пользователей в архив порциями,
+    затем маленькими шагами возвращает освободившиеся страницы
+    (auto_vacuum=INCREMENTAL включает init_db до начала polling).
+    Вся работа с БД — в отдельном потоке, между шагами отдаём управление циклу событий.
+    """
+    archived = 0
+    while True:
+        moved = await asyncio.to_thread(archive_inactive_users, ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE)
+        archived += moved
+        if moved < ARCHIVE_BATCH_SIZE:
+            break
+        await asyncio.sleep(RETENTION_PAUSE)
+
+    remaining = None
+    while True:
+        left = await asyncio.to_thread(incremental_vacuum_step, VACUUM_STEP_PAGES)
+        if not left or left == remaining:
+            break
+        remaining = left
+        await asyncio.sleep(RETENTION_PAUSE)
+
+    size = await asyncio.to_thread(get_db_size)
+    logger.info(
+        "Retention [%s]: archived %d users; db %.1f MB (%d pages of %d B, %d free), archive %.1f MB",
+        tenant_name(), archived, size["db_bytes"] / 2**20, size["page_count"], size["page_size"],
+        size["freelist_count"], size["archive_bytes"] / 2**20,
+    )
+    return {"archived": archived, **size}
+
+
+async def retention_loop(interval: float = RETENTION_INTERVAL) -> None:
+    """Фоновая задача: периодически архивирует неактивных пользователей всех ботов"""
+    while True:
+        for tenant in all_tenants():
+            with use_tenant(tenant):
+                try:
+                    await run_retention()
+                except Exception:
+                    logger.exception("Retention run failed")
+        await asyncio.sleep(interval)
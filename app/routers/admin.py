@@ -1,11 +1,23 @@
+import html
 import os
+from typing import Optional
+
 from aiogram import F, Router
-from aiogram.types import CallbackQuery
+from aiogram.filters import Command, CommandObject
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup, Message
 
-from app.db import get_recent_users
+from app.backup import backup_and_verify
+from app.core.tasks import supervisor
+from app.core.tenants import Tenant, TenantLocal, TenantMiddleware, get_admin_id
+from app.db import get_db_size, get_recent_users, get_stats, search_users
+from app.keyboards.inline import ADMIN_SEARCH_CB_PREFIX, build_search_pages_kb
+from app.questions import LEVELS, get_level_name
 
 router = Router(name=__name__)
-ADMIN_ID = int(os.getenv("ADMIN_ID", "0"))
+SEARCH_PAGE_SIZE = 10
+
+# Последний поисковый запрос админа (для листания страниц), у каждого бота свой — листание идёт по БД своего бота
+ADMIN_SEARCHES: TenantLocal = TenantLocal(dict)
 
 
 def format_user_label(telegram_id: int, username: str | None, first_name: str | None, last_name: str | None) -> str:
@@ -15,9 +27,9 @@ def format_user_label(telegram_id: int, username: str | None, first_name: str |
         full_name = " ".join(filter(None, [first_name, last_name]))
     
     if username:
-        return f"@{username}"
+        return f"@{html.escape(username)}"
     elif full_name:
-        return f'<a href="tg://user?id={telegram_id}">{full_name}</a>'
+        return f'<a href="tg://user?id={telegram_id}">{html.escape(full_name)}</a>'
     else:
         return f"ID: {telegram_id}"
 
@@ -25,7 +37,7 @@ def format_user_label(telegram_id: int, username: str | None, first_name: str |
 @router.callback_query(F.data == "admin_recent_users")
 async def recent_users_handler(callback: CallbackQuery) -> None:
     """Обработчик кнопки для администратора: показывает последних 10 пользователей"""
-    if callback.from_user.id != ADMIN_ID:
+    if callback.from_user.id != get_admin_id():
         await callback.answer("Доступ запрещен", show_alert=True)
         return
     
@@ -47,3 +59,175 @@ async def recent_users_handler(callback: CallbackQuery) -> None:
     await callback.message.answer(text)
     await callback.answer()
 
+
+def render_search_page(query: str, page: int) -> tuple[str, InlineKeyboardMarkup | None]:
+    """Строит текст страницы результатов поиска и кнопки листания"""
+    offset = page * SEARCH_PAGE_SIZE
+    # Берём на одну запись больше, чтобы понять, есть ли следующая страница
+    users = search_users(query, limit=SEARCH_PAGE_SIZE + 1, offset=offset)
+    has_next = len(users) > SEARCH_PAGE_SIZE
+    users = users[:SEARCH_PAGE_SIZE]
+
+    if not users:
+        return f"По запросу «{html.escape(query)}» никого не нашлось.", build_search_pages_kb(page, False)
+
+    lines = [f"<b>Поиск «{html.escape(query)}», страница {page + 1}:</b>\n"]
+    for i, (telegram_id, username, first_name, last_name, created_at, score) in enumerate(users, offset + 1):
+        user_label = format_user_label(telegram_id, username, first_name, last_name)
+        score_text = f", результат: {score}" if score else ""
+        lines.append(f"{i}. {user_label}{score_text}")
+
+    return "\n".join(lines), build_search_pages_kb(page, has_next)
+
+
+@router.callback_query(F.data == "admin_search_help")
+async def search_help_handler(callback: CallbackQuery) -> None:
+    """Подсказка по поиску пользователей"""
+    if callback.from_user.id != get_admin_id():
+        await callback.answer("Доступ запрещен", show_alert=True)
+        return
+
+    await callback.message.answer(
+        "Поиск по username, имени или фамилии (можно начало слова):\n"
+        "<code>/search марина</code>"
+    )
+    await callback.answer()
+
+
+@router.message(Command("search"))
+async def search_users_handler(message: Message, command: CommandObject) -> None:
+    """/search <запрос>: поиск пользователей для администратора"""
+    if message.from_user.id != get_admin_id():
+        return
+
+    query = (command.args or "").strip()
+    if not query:
+        await message.answer("Напиши, кого искать: <code>/search марина</code>")
+        return
+
+    ADMIN_SEARCHES[message.from_user.id] = query
+    text, kb = render_search_page(query, 0)
+    await message.answer(text, reply_markup=kb)
+
+
+@router.callback_query(F.data.startswith(ADMIN_SEARCH_CB_PREFIX))
+async def search_page_handler(callback: CallbackQuery) -> None:
+    """Листание результатов поиска"""
+    if callback.from_user.id != get_admin_id():
+        await callback.answer("Доступ запрещен", show_alert=True)
+        return
+
+    query = ADMIN_SEARCHES.get(callback.from_user.id)
+    if not query:
+        await callback.answer("Поиск устарел, повтори /search", show_alert=True)
+        return
+
+    try:
+        page = max(0, int((callback.data or "").replace(ADMIN_SEARCH_CB_PREFIX, "")))
+    except ValueError:
+        await callback.answer("Ошибка кнопки.", show_alert=True)
+        return
+
+    text, kb = render_search_page(query, page)
+    await callback.message.edit_text(text, reply_markup=kb)
+    await callback.answer()
+
+
+def render_stats(tenant_metrics: Optional[dict] = None) -> str:
+    """Текст статистики из счётчиков в БД; tenant_metrics — нагрузка на этого бота, если ботов несколько"""
+    stats = get_stats(days=7)
+    new_users, started, finished = stats["totals"]
+
+    lines = [
+        "<b>Статистика</b>\n",
+        f"Пользователей: {new_users}",
+        f"Тестов начато: {started}, завершено: {finished}",
+    ]
+
+    if stats["daily"]:
+        lines.append("\n<b>По дням (новые / начали / завершили):</b>")
+        for day, day_users, day_started, day_finished in stats["daily"]:
+            lines.append(f"{day}: {day_users} / {day_started} / {day_finished}")
+
+    histogram = stats["histogram"]
+    if histogram:
+        by_level = {name: 0 for _, name in LEVELS}
+        for score, users in histogram:
+            by_level[get_level_name(score)] += users
+        total = sum(by_level.values())
+        average = sum(score * users for score, users in histogram) / total
+        lines.append(f"\n<b>Результаты ({total} чел., средний балл {average:.1f}):</b>")
+        for name, users in by_level.items():
+            lines.append(f"{name}: {users} ({users * 100 / total:.0f}%)")
+
+    size = get_db_size()
+    lines.append(
+        f"\nБД: {size['db_bytes'] / 2**20:.1f} МБ ({size['page_count']} стр., свободных {size['freelist_count']}), "
+        f"архив: {size['archive_bytes'] / 2**20:.1f} МБ"
+    )
+
+    lines.append("\n<b>Фоновые задачи (ждут / выполняются / упали / повторы):</b>")
+    for name, group in supervisor.stats().items():
+        lines.append(
+            f"{name}: {group['pending']} / {group['running']} / {group.get('failed', 0)} / {group.get('retried', 0)}"
+        )
+
+    if tenant_metrics:
+        lines.append(
+            f"\n<b>Бот:</b> апдейтов {tenant_metrics.get('updates', 0)}, ошибок {tenant_metrics.get('errors', 0)}, "
+            f"ждали очереди {tenant_metrics.get('waited', 0)}, в среднем {tenant_metrics['avg_ms']:.0f} мс"
+        )
+    return "\n".join(lines)
+
+
+@router.callback_query(F.data == "admin_stats")
+async def stats_handler(
+    callback: CallbackQuery,
+    tenancy: Optional[TenantMiddleware] = None,
+    tenant: Optional[Tenant] = None,
+) -> None:
+    """Обработчик кнопки для администратора: сводная статистика"""
+    if callback.from_user.id != get_admin_id():
+        await callback.answer("Доступ запрещен", show_alert=True)
+        return
+
+    tenant_metrics = None
+    if tenancy is not None and tenant is not None and len(tenancy.metrics) > 1:
+        tenant_metrics = tenancy.stats()[tenant.name]
+    await callback.message.answer(render_stats(tenant_metrics))
+    await callback.answer()
+
+
+def format_backup(snapshot: dict) -> str:
+    """Файл снимка, размер, результат проверки восстановления и начало контрольной суммы"""
+    verify = snapshot["verify"]
+    if not verify["ok"]:
+        status = f"проверка НЕ пройдена: {html.escape(str(verify.get('error') or verify.get('integrity')))}"
+    elif verify["schema_version"] is not None:
+        status = f"проверка пройдена (схема v{verify['schema_version']}, пользователей: {verify['users']})"
+    else:
+        status = f"проверка пройдена (пользователей: {verify['users']})"
+    return (
+        f"<code>{html.escape(os.path.basename(snapshot['path']))}</code>\n"
+        f"{snapshot['bytes'] / 2**20:.1f} МБ за {snapshot['seconds']:.1f} с, {status}\n"
+        f"sha256: <code>{snapshot['sha256'][:16]}…</code>"
+    )
+
+
+@router.message(Command("backup"))
+async def backup_handler(message: Message) -> None:
+    """/backup: внеочередная резервная копия БД с проверкой восстановления"""
+    if message.from_user.id != get_admin_id():
+        return
+
+    await message.answer("Делаю резервную копию…")
+    try:
+        result = await backup_and_verify()
+    except Exception as e:
+        await message.answer(f"Не удалось сделать копию: {html.escape(str(e))}")
+        raise
+
+    text = f"Копия готова: {format_backup(result)}"
+    if result["archive"] is not None:
+        text += f"\n\nАрхив пользователей: {format_backup(result['archive'])}"
+    await message.answer(text)
@@ -1,26 +1,24 @@
-import asyncio
-import os
-
 from aiogram import F, Router
 from aiogram.types import CallbackQuery, Message, ReplyKeyboardRemove
 
+from app.core.notify import NOTIFIERS, user_label
+from app.core.tenants import get_admin_id
 from app.keyboards.inline import build_menu_inline
-from app.promo import schedule_promo
-from app.db import user_exists, save_user_from_user
+from app.promo import start_promo
+from app.db import save_user_from_user
 
 # сессия и отправка первого вопроса живут в test.py
 from app.routers.test import SESSIONS, UserSession, send_question
 
 router = Router()
-ADMIN_ID = int(os.getenv("ADMIN_ID", "0"))
 
 
-@router.message(F.text == "Меню")
+@router.message(F.text == "Меню", flags={"throttle": "menu"})
 async def menu_handler(message: Message) -> None:
     # Сохраняем пользователя в базу, если его ещё нет
     save_user_from_user(message.from_user)
     
-    is_admin = message.from_user.id == ADMIN_ID
+    is_admin = message.from_user.id == get_admin_id()
     kb = build_menu_inline(is_admin=is_admin)
     await message.answer(
         "Меню:\n\nВыбери действие:",
@@ -28,43 +26,27 @@ async def menu_handler(message: Message) -> None:
     )
 
 
-@router.callback_query(F.data == "start_test")
+@router.callback_query(F.data == "start_test", flags={"throttle": "start_test"})
 async def start_test_callback(callback: CallbackQuery) -> None:
     user_id = callback.from_user.id
     bot = callback.message.bot
 
-    # Сохраняем пользователя в базу, если его ещё нет
-    save_user_from_user(callback.from_user)
+    # Сохраняем пользователя в базу, если его ещё нет, и учитываем начало теста в статистике.
+    # Заодно узнаём, первый ли это тест пользователя (отметка в users, а не наличие результата)
+    first_test = save_user_from_user(callback.from_user, test_started=True)
 
     # Стартуем сессию теста
     SESSIONS[user_id] = UserSession(current_index=0, score=0)
 
-    # Уведомляем хозяйку бота (ADMIN_ID должен быть в .env)
-    admin_id = int(os.getenv("ADMIN_ID"))
-
-    username = callback.from_user.username
-    full_name = callback.from_user.full_name or ""
-
-    if username:
-        user_label = f"@{username}"
-    elif full_name:
-        user_label = f'<a href="tg://user?id={user_id}">@{full_name}</a>'
-    else:
-        user_label = f"ID: {user_id}"
-
-    if not user_exists(user_id):
-        await bot.send_message(
-            admin_id,
-            f"Новый пользователь начал проходить тест: {user_label}",
-        )
+    # Уведомляем хозяйку бота (при всплеске — сводками)
+    if first_test:
+        NOTIFIERS.new_user(bot, user_label(callback.from_user))
 
     # Фоновая задача с отложенной рекламой
-    asyncio.create_task(
-        schedule_promo(
-            bot=bot,
-            chat_id=callback.message.chat.id,
-            telegram_id=user_id,
-        )
+    start_promo(
+        bot=bot,
+        chat_id=callback.message.chat.id,
+        telegram_id=user_id,
     )
 
     # Приветствие теста
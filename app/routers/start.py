@@ -8,7 +8,7 @@ from app.keyboards.reply import get_main_keyboard
 router = Router(name=__name__)
 
 
-@router.message(CommandStart())
+@router.message(CommandStart(), flags={"throttle": "start"})
 async def start_handler(message: Message) -> None:
     """
     /start: приветствие + нижняя кнопка "Меню".
@@ -1,10 +1,18 @@
 import asyncio
+import logging
 import os
+from collections import Counter
 from dataclasses import dataclass
+from functools import lru_cache
 
 from aiogram import F, Router
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import CallbackQuery, Message, FSInputFile
 
+from app.core.session_store import TTLStore, get_rss_bytes
+from app.core.notify import NOTIFIERS, user_label
+from app.core.tenants import TenantLocal, all_tenants, tenant_name, use_tenant
+from app.core.tracing import pause
 from app.db import update_score
 from app.keyboards.inline import (
     build_question_text_and_kb,
@@ -12,22 +20,81 @@ from app.keyboards.inline import (
     RESULT_PAGE_CB_PREFIX
 )
 from app.keyboards.reply import get_main_keyboard
-from app.questions import QUESTIONS, interpret_score, get_result_image_name
+from app.questions import QUESTIONS, interpret_score, get_level_name, get_result_image_name
 
 router = Router()
-ADMIN_ID = int(os.getenv("ADMIN_ID", "0"))
+logger = logging.getLogger(__name__)
+
+# Сколько живёт брошенная сессия теста / непрочитанный результат (сек) и сколько их храним максимум
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(2 * 60 * 60)))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "10000"))
+RESULT_PAGES_TTL = float(os.getenv("RESULT_PAGES_TTL", str(24 * 60 * 60)))
+RESULT_PAGES_MAX = int(os.getenv("RESULT_PAGES_MAX", "10000"))
+SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "300"))
+# Как листать результат по кнопке «Подробнее»:
+# cumulative — одно сообщение, каждая страница — всё более длинное начало текста (как было);
+# replace — одно сообщение, на месте показывается только следующий кусок;
+# append — каждый следующий кусок приходит новым сообщением.
+RESULT_PAGING_MODE = os.getenv("RESULT_PAGING_MODE", "cumulative")
 
 
 @dataclass
 class UserSession:
     current_index: int = 0
     score: int = 0
+    # Коды выбранных вариантов по порядку вопросов ("abdc…")
+    answers: str = ""
+
+
+# Брошенные сессии по номеру вопроса, на котором пользователь ушёл (воронка отвала)
+ABANDONED_BY_QUESTION: TenantLocal = TenantLocal(Counter)
+
+
+def _on_session_evicted(user_id: int, session: "UserSession", reason: str) -> None:
+    ABANDONED_BY_QUESTION[session.current_index] += 1
 
 
-# Простое хранение состояния в памяти
-SESSIONS: dict[int, UserSession] = {}
+# Хранение состояния в памяти (с вытеснением старых записей), у каждого бота своё
+SESSIONS: TenantLocal = TenantLocal(lambda: TTLStore(SESSION_TTL, SESSION_MAX, on_evict=_on_session_evicted))
 PAGE_SIZE = 700
-RESULT_PAGES: dict[int, list[str]] = {}
+RESULT_PAGES: TenantLocal = TenantLocal(lambda: TTLStore(RESULT_PAGES_TTL, RESULT_PAGES_MAX))
+# file_id загруженных картинок результата: имя файла -> file_id (у каждого бота свои file_id)
+RESULT_PHOTOS: TenantLocal = TenantLocal(dict)
+
+
+def session_stats() -> dict:
+    """Сводка по сессиям в памяти: размеры, вытеснения, воронка отвала и RSS на сессию"""
+    active = len(SESSIONS) + len(RESULT_PAGES)
+    rss = get_rss_bytes()
+    return {
+        "sessions": len(SESSIONS),
+        "result_pages": len(RESULT_PAGES),
+        "sessions_evicted_ttl": SESSIONS.evicted_ttl,
+        "sessions_evicted_lru": SESSIONS.evicted_lru,
+        "result_pages_evicted": RESULT_PAGES.evicted_ttl + RESULT_PAGES.evicted_lru,
+        "abandoned_by_question": dict(sorted(ABANDONED_BY_QUESTION.items())),
+        "rss_bytes": rss,
+        "rss_per_session_bytes": rss // active if active else 0,
+    }
+
+
+async def sweep_sessions(interval: float = SESSION_SWEEP_INTERVAL) -> None:
+    """Фоновая задача: периодически удаляет просроченные сессии и пишет сводку в лог"""
+    while True:
+        await asyncio.sleep(interval)
+        for tenant in all_tenants():
+            with use_tenant(tenant):
+                SESSIONS.sweep()
+                RESULT_PAGES.sweep()
+                stats = session_stats()
+                logger.info(
+                    "Sessions [%s]: %d active, %d result pages, evicted %d/%d (ttl/lru), "
+                    "RSS %.1f MB (%.1f KB per session), abandoned by question: %s",
+                    tenant_name(), stats["sessions"], stats["result_pages"],
+                    stats["sessions_evicted_ttl"], stats["sessions_evicted_lru"],
+                    stats["rss_bytes"] / 2**20, stats["rss_per_session_bytes"] / 1024,
+                    stats["abandoned_by_question"],
+                )
 
 def split_text(text: str, size: int = PAGE_SIZE) -> list[str]:
     """
@@ -53,6 +120,77 @@ def split_text(text: str, size: int = PAGE_SIZE) -> list[str]:
     return pages
 
 
+def split_paragraphs(text: str, size: int = PAGE_SIZE) -> list[str]:
+    """
+    Разбивает текст на непересекающиеся страницы по границам абзацев:
+    абзацы набираются в страницу, пока она не длиннее size символов.
+    Слишком длинный абзац режется по словам.
+    """
+    pages: list[str] = []
+    current = ""
+    for paragraph in text.strip().split("\n\n"):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        candidate = f"{current}\n\n{paragraph}" if current else paragraph
+        if len(candidate) <= size:
+            current = candidate
+            continue
+        if current:
+            pages.append(current)
+        current = ""
+        # абзац сам по себе длиннее страницы
+        while len(paragraph) > size:
+            cut = paragraph.rfind(" ", 0, size)
+            if cut <= 0:
+                cut = size
+            pages.append(paragraph[:cut].rstrip())
+            paragraph = paragraph[cut:].lstrip()
+        current = paragraph
+    if current:
+        pages.append(current)
+    return pages
+
+
+def build_result_pages(text: str, mode: str = RESULT_PAGING_MODE) -> list[str]:
+    """Страницы результата для выбранного режима листания"""
+    if mode in ("replace", "append"):
+        return split_paragraphs(text)
+    return split_text(text)
+
+
+@lru_cache(maxsize=None)
+def result_pages(score: int) -> tuple[str, ...]:
+    """
+    Страницы результата для балла. Возможных баллов несколько десятков,
+    поэтому нарезка кэшируется по баллу (и считается заранее при прогреве).
+    """
+    return tuple(build_result_pages(interpret_score(score)))
+
+
+def result_image_path(image_name: str) -> str:
+    # Картинки лежат рядом с этим файлом, в папке images
+    return os.path.join(os.path.dirname(__file__), "images", image_name)
+
+
+async def send_result_photo(message: Message, image_name: str, caption: str) -> None:
+    """
+    Фото результата. Файл загружается в Telegram один раз на бота, дальше отправляется по file_id.
+    Если file_id устарел — загружаем заново.
+    """
+    file_id = RESULT_PHOTOS.get(image_name)
+    if file_id:
+        try:
+            await message.answer_photo(photo=file_id, caption=caption)
+            return
+        except TelegramBadRequest:
+            logger.warning("Cached file_id for %s rejected, uploading again", image_name)
+            RESULT_PHOTOS.pop(image_name, None)
+    sent = await message.answer_photo(photo=FSInputFile(result_image_path(image_name)), caption=caption)
+    if sent.photo:
+        RESULT_PHOTOS[image_name] = sent.photo[-1].file_id
+
+
 async def send_question(message: Message, q_index: int) -> None:
     """
     Отправка вопроса (новым сообщением)
@@ -72,66 +210,67 @@ async def send_question_cb(callback: CallbackQuery, q_index: int) -> None:
 @router.callback_query(F.data.startswith("answer:"))
 async def answer_handler(callback: CallbackQuery) -> None:
     """
-    Обработка ответов на вопросы: callback_data='answer:<points>'
+    Обработка ответов на вопросы: callback_data='answer:<q_index>:<points>'
     """
     user_id = callback.from_user.id
     bot = callback.message.bot
 
+    data = callback.data or ""
+    try:
+        parts = data.split(":")
+        points = int(parts[-1])
+        # старые клавиатуры (до номера вопроса в кнопке): answer:<points>
+        q_index = int(parts[1]) if len(parts) == 3 else None
+    except Exception:
+        await callback.answer("Ошибка данных ответа. Попробуй ещё раз.", show_alert=True)
+        return
+
     session = SESSIONS.get(user_id)
     if session is None:
+        if q_index:
+            await callback.answer("Сессия теста устарела. Начни тест заново через «Меню».", show_alert=True)
+            return
         session = UserSession()
         SESSIONS[user_id] = session
 
-    data = callback.data or ""
-    try:
-        _, points_str = data.split(":")
-        points = int(points_str)
-    except Exception:
-        await callback.answer("Ошибка данных ответа. Попробуй ещё раз.", show_alert=True)
+    # Ответ на уже пройденный вопрос (двойное нажатие) — игнорируем
+    if q_index is not None and q_index != session.current_index:
+        await callback.answer()
         return
 
-    # Добавляем баллы и двигаемся к следующему вопросу
+    # Добавляем баллы, запоминаем вариант и двигаемся к следующему вопросу
+    if session.current_index < len(QUESTIONS):
+        options = QUESTIONS[session.current_index].options
+        session.answers += next((o.code for o in options if o.points == points), "?")
     session.score += points
     session.current_index += 1
 
     # --- ФИНАЛ ТЕСТА ---
     if session.current_index >= len(QUESTIONS):
         score = session.score
-        result_text = interpret_score(score)
 
         # Краткий уровень для подписи к фото
-        if score <= 17:
-            level = "ЗЕЛЕНЫЙ УРОВЕНЬ"
-        elif score <= 34:
-            level = "ЖЕЛТЫЙ УРОВЕНЬ"
-        elif score <= 52:
-            level = "КРАСНЫЙ УРОВЕНЬ"
-        else:
-            level = "МИГАЮЩИЙ КРАСНЫЙ"
+        level = get_level_name(score)
 
         # Очищаем сессию
         if user_id in SESSIONS:
             del SESSIONS[user_id]
 
-        # Путь к картинке (как в твоём main.py: рядом с этим файлом папка images)
         image_name = get_result_image_name(score)
-        base_dir = os.path.dirname(__file__)
-        image_path = os.path.join(base_dir, "images", image_name)
 
         await callback.message.edit_text("Тест завершён. Считаем результат…")
 
-        await asyncio.sleep(2)
+        await pause(2)
 
-        photo = FSInputFile(image_path)
         caption = f"{level}\nТвои баллы: {score}"
 
         # 1) Фото с короткой подписью
-        await callback.message.answer_photo(photo=photo, caption=caption)
+        await send_result_photo(callback.message, image_name, caption)
 
-        await asyncio.sleep(2)
+        await pause(2)
 
         # 2) Текст интерпретации частями + кнопка "Подробнее"
-        pages = split_text(result_text)
+        pages = result_pages(score)
         RESULT_PAGES[user_id] = pages
 
         kb = build_result_kb_for_page(0, len(pages))
@@ -143,21 +282,9 @@ async def answer_handler(callback: CallbackQuery) -> None:
             "Если хочешь, можешь вернуться в меню и пройти тест ещё раз или поделиться им.",
             reply_markup=get_main_keyboard(),
         )
-        username = callback.from_user.username
-        full_name = callback.from_user.full_name or ""
-
-        if username:
-            user_label = f"@{username}"
-        elif full_name:
-            user_label = f'<a href="tg://user?id={user_id}">@{full_name}</a>'
-        else:
-            user_label = f"ID: {user_id}"
-
-        await bot.send_message(
-            ADMIN_ID,
-            f"Пользователь {user_label}, результат - {score}"
-        )
-        update_score(user_id, score)
+        # Уведомляем хозяйку бота (при всплеске — сводками)
+        NOTIFIERS.test_finished(bot, user_label(callback.from_user), score)
+        update_score(user_id, score, session.answers)
 
         await callback.answer()
         return
@@ -188,7 +315,12 @@ async def result_more_handler(callback: CallbackQuery) -> None:
         return
 
     kb = build_result_kb_for_page(page, len(pages))
-    await callback.message.edit_text(pages[page], reply_markup=kb)
+    if RESULT_PAGING_MODE == "append":
+        # Убираем кнопку у прочитанного куска и присылаем следующий отдельным сообщением
+        await callback.message.edit_reply_markup(reply_markup=None)
+        await callback.message.answer(pages[page], reply_markup=kb)
+    else:
+        await callback.message.edit_text(pages[page], reply_markup=kb)
 
     # УДАЛЕНИЕ: если показали последнюю страницу — чистим
     if page == len(pages) - 1:
@@ -0,0 +1,223 @@
+"""
+Офлайн-аналитика теста по копии БД: распределение баллов, частоты вариантов по вопросам,
+связь каждого вопроса с итогом и чувствительность границ уровней (LEVELS из app/questions.py).
+
+    python -m app.tools.analytics /data/backups/bot-20260101-030000.db.gz
+    python -m app.tools.analytics bot.db --chunk 500000 --window 3 --out report.json
+
+Нужен numpy (в образ бота не входит): pip install numpy.
+Строки читаются порциями по --chunk прямо в массивы numpy, дальше всё считается без циклов по строкам.
+Ответы по вопросам есть только у тестов, пройденных после миграции 6 (users.answers);
+распределение баллов строится по всем завершённым тестам.
+"""
+import argparse
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    raise SystemExit("Для аналитики нужен numpy: pip install numpy")
+
+from app.questions import LEVELS, QUESTIONS
+
+LEVEL_BOUNDS = np.array([upper for upper, _ in LEVELS if upper is not None])
+LEVEL_NAMES = [name for _, name in LEVELS]
+MAX_OPTIONS = max(len(q.options) for q in QUESTIONS)
+MAX_SCORE = sum(max(o.points for o in q.options) for q in QUESTIONS)
+
+# Баллы варианта: POINTS[вопрос, номер варианта]
+POINTS = np.zeros((len(QUESTIONS), MAX_OPTIONS))
+# Номер варианта по байту его кода: OPTION_INDEX[вопрос, ord(код)], -1 — неизвестный код
+OPTION_INDEX = np.full((len(QUESTIONS), 256), -1, dtype=np.int8)
+for _q, _question in enumerate(QUESTIONS):
+    for _j, _option in enumerate(_question.options):
+        POINTS[_q, _j] = _option.points
+        OPTION_INDEX[_q, ord(_option.code)] = _j
+
+
+def load(path: str, chunk: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Баллы всех завершённых тестов и матрица выбранных вариантов (строка — тест, столбец — вопрос).
+    БД открывается только на чтение.
+    """
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        parts = []
+        cur = conn.execute("SELECT score FROM users WHERE score > 0")
+        while rows := cur.fetchmany(chunk):
+            parts.append(np.fromiter((row[0] for row in rows), dtype=np.int32, count=len(rows)))
+        scores = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int32)
+
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+        parts = []
+        if "answers" in columns:
+            cur = conn.execute(
+                "SELECT answers FROM users WHERE score > 0 AND length(answers) = ?", (len(QUESTIONS),)
+            )
+            while rows := cur.fetchmany(chunk):
+                # Вся порция — один буфер байтов, разворачиваемый в матрицу без цикла по строкам
+                codes = np.frombuffer("".join(row[0] for row in rows).encode("ascii", "replace"), dtype=np.uint8)
+                codes = codes.reshape(len(rows), len(QUESTIONS))
+                parts.append(OPTION_INDEX[np.arange(len(QUESTIONS)), codes])
+    finally:
+        conn.close()
+
+    answers = np.concatenate(parts) if parts else np.zeros((0, len(QUESTIONS)), dtype=np.int8)
+    return scores, answers[(answers >= 0).all(axis=1)]
+
+
+def levels_of(scores: np.ndarray) -> np.ndarray:
+    """Номер уровня в LEVELS для каждого балла (та же граница «<=», что в get_level_name)"""
+    return np.searchsorted(LEVEL_BOUNDS, scores, side="left")
+
+
+def score_report(scores: np.ndarray) -> dict:
+    histogram = np.bincount(scores, minlength=MAX_SCORE + 1)
+    by_level = np.bincount(levels_of(scores), minlength=len(LEVELS))
+    p5, p25, p50, p75, p95 = np.percentile(scores, [5, 25, 50, 75, 95])
+    return {
+        "tests": int(scores.size),
+        "mean": float(scores.mean()),
+        "std": float(scores.std()),
+        "percentiles": {"p5": float(p5), "p25": float(p25), "p50": float(p50), "p75": float(p75), "p95": float(p95)},
+        "levels": {name: int(count) for name, count in zip(LEVEL_NAMES, by_level)},
+        "histogram": {int(score): int(count) for score, count in enumerate(histogram) if count},
+    }
+
+
+def boundary_report(scores: np.ndarray, window: int) -> list[dict]:
+    """
+    Для каждой границы уровня: сколько тестов сменило бы уровень, если сдвинуть границу на ±1..±window,
+    и сколько их лежит вплотную к границе.
+    """
+    histogram = np.bincount(scores, minlength=MAX_SCORE + window + 2)
+    # cumulative[s] — тестов с баллом <= s
+    cumulative = np.cumsum(histogram)
+    shifts = np.arange(-window, window + 1)
+    report = []
+    for bound in LEVEL_BOUNDS:
+        moved = np.abs(cumulative[np.clip(bound + shifts, 0, None)] - cumulative[bound])
+        near = histogram[max(0, bound - window + 1):bound + window + 1].sum()
+        report.append({
+            "bound": int(bound),
+            "near_share": float(near / scores.size),
+            "moved_share": {f"{shift:+d}": float(m / scores.size) for shift, m in zip(shifts, moved) if shift},
+        })
+    return report
+
+
+def item_report(answers: np.ndarray) -> dict:
+    """
+    Частоты вариантов по вопросам, исправленная корреляция «вопрос — сумма остальных»,
+    альфа Кронбаха и доля разброса баллов вопроса, объяснённая уровнем (eta²).
+    """
+    n, n_questions = answers.shape
+    frequencies = np.bincount(
+        (answers + MAX_OPTIONS * np.arange(n_questions)).ravel(), minlength=MAX_OPTIONS * n_questions
+    ).reshape(n_questions, MAX_OPTIONS) / n
+
+    item_points = POINTS[np.arange(n_questions), answers]
+    total = item_points.sum(axis=1)
+    rest = total[:, None] - item_points
+    items_c = item_points - item_points.mean(axis=0)
+    rest_c = rest - rest.mean(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        item_total = (items_c * rest_c).sum(axis=0) / np.sqrt((items_c ** 2).sum(axis=0) * (rest_c ** 2).sum(axis=0))
+
+    variances = item_points.var(axis=0)
+    alpha = n_questions / (n_questions - 1) * (1 - variances.sum() / total.var()) if total.var() else float("nan")
+
+    levels = levels_of(total.astype(np.int32))
+    level_counts = np.bincount(levels, minlength=len(LEVELS))
+    # Средний балл вопроса на каждом уровне: (уровни × вопросы)
+    level_sums = np.stack(
+        [np.bincount(levels, weights=item_points[:, q], minlength=len(LEVELS)) for q in range(n_questions)], axis=1
+    )
+    with np.errstate(invalid="ignore", divide="ignore"):
+        level_means = level_sums / level_counts[:, None]
+        between = (level_counts[:, None] * (np.nan_to_num(level_means) - item_points.mean(axis=0)) ** 2).sum(axis=0)
+        eta2 = between / (items_c ** 2).sum(axis=0)
+
+    questions = []
+    for q, question in enumerate(QUESTIONS):
+        questions.append({
+            "id": question.id,
+            "options": {o.code: float(frequencies[q, j]) for j, o in enumerate(question.options)},
+            "item_total_r": float(item_total[q]),
+            "eta2_levels": float(eta2[q]),
+            "mean_by_level": {
+                name: (None if not level_counts[lvl] else float(level_means[lvl, q]))
+                for lvl, name in enumerate(LEVEL_NAMES)
+            },
+        })
+    return {"tests": int(n), "cronbach_alpha": float(alpha), "questions": questions}
+
+
+def print_report(report: dict) -> None:
+    scores = report["scores"]
+    print(f"Tests: {scores['tests']}, mean {scores['mean']:.1f} ± {scores['std']:.1f}, "
+          + ", ".join(f"{k} {v:.0f}" for k, v in scores["percentiles"].items()))
+    for name, count in scores["levels"].items():
+        print(f"  {name:<20}{count:>10} ({count * 100 / max(1, scores['tests']):.1f}%)")
+
+    print("\nLevel bounds (share of tests that would change level if the bound moved):")
+    for row in report["bounds"]:
+        moved = "  ".join(f"{shift}:{share * 100:.1f}%" for shift, share in row["moved_share"].items())
+        print(f"  <= {row['bound']:<4} near {row['near_share'] * 100:5.1f}%   {moved}")
+
+    items = report["items"]
+    if not items["tests"]:
+        print("\nNo per-answer data yet (users.answers is filled for tests finished after migration 6)")
+        return
+    print(f"\nPer-question ({items['tests']} tests with answers, Cronbach's alpha {items['cronbach_alpha']:.2f}):")
+    print(f"  {'q':<4}{'options a/b/c/d, %':<28}{'r item-rest':>12}{'eta² lvl':>10}  mean points by level")
+    for q in items["questions"]:
+        options = "/".join(f"{share * 100:.0f}" for share in q["options"].values())
+        means = " ".join("-" if m is None else f"{m:.1f}" for m in q["mean_by_level"].values())
+        print(f"  {q['id']:<4}{options:<28}{q['item_total_r']:>12.2f}{q['eta2_levels']:>10.2f}  {means}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("db", help="копия bot.db или снимок из BACKUP_DIR (.db.gz)")
+    parser.add_argument("--chunk", type=int, default=200_000, help="строк за одно чтение")
+    parser.add_argument("--window", type=int, default=3, help="на сколько баллов сдвигать границы уровней")
+    parser.add_argument("--out", help="сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db
+        if path.endswith(".gz"):
+            path = os.path.join(tmp, "snapshot.db")
+            with gzip.open(args.db, "rb") as f_in, open(path, "wb") as f_out:
+                shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+
+        started = time.perf_counter()
+        scores, answers = load(path, args.chunk)
+        loaded = time.perf_counter()
+
+    if not scores.size:
+        raise SystemExit("No finished tests in this database")
+    report = {
+        "scores": score_report(scores),
+        "bounds": boundary_report(scores, args.window),
+        "items": item_report(answers) if answers.size else {"tests": 0},
+    }
+    computed = time.perf_counter()
+
+    print_report(report)
+    print(f"\nLoaded {scores.size} scores / {len(answers)} answer rows in {loaded - started:.2f}s, "
+          f"computed in {computed - loaded:.2f}s")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
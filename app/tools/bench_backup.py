@@ -0,0 +1,81 @@
+"""
+Влияние резервного копирования на задержку обработчиков.
+
+    python -m app.tools.bench_backup --rows 1000000
+
+Пока идёт backup_and_verify(), на цикле событий каждые 10 мс выполняется «обработчик»:
+те же синхронные запросы к БД, что в хендлерах (чтение и запись по telegram_id).
+Сравниваются задержки обработчика и лаг цикла событий в покое и во время копии.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from app import backup, db
+from app.tools.bench_db import fill_db
+
+
+async def probe(rows: int, stop: asyncio.Event, handler_times: list, lags: list) -> None:
+    rnd = random.Random(1)
+    interval = 0.01
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - expected))
+
+        telegram_id = 1_000_000 + rnd.randrange(rows)
+        started = time.perf_counter()
+        db.is_promo_sent(telegram_id)
+        db.update_score(telegram_id, rnd.randrange(7, 71))
+        handler_times.append(time.perf_counter() - started)
+
+
+def summary(values: list) -> str:
+    values = sorted(values)
+    p99 = values[min(len(values) - 1, int(len(values) * 0.99))]
+    return f"p50 {statistics.median(values) * 1000:7.2f} ms  p99 {p99 * 1000:7.2f} ms  max {values[-1] * 1000:7.2f} ms"
+
+
+async def run(rows: int, idle_seconds: float) -> None:
+    handler_idle, lag_idle = [], []
+    stop = asyncio.Event()
+    task = asyncio.create_task(probe(rows, stop, handler_idle, lag_idle))
+    await asyncio.sleep(idle_seconds)
+    stop.set()
+    await task
+
+    handler_busy, lag_busy = [], []
+    stop = asyncio.Event()
+    task = asyncio.create_task(probe(rows, stop, handler_busy, lag_busy))
+    result = await backup.backup_and_verify()
+    stop.set()
+    await task
+
+    print(f"Backup {result['bytes'] / 2**20:.1f} MB in {result['seconds']:.1f}s, verify: {result['verify']}")
+    print(f"handler idle:   {summary(handler_idle)}")
+    print(f"handler backup: {summary(handler_busy)}")
+    print(f"loop lag idle:   {summary(lag_idle)}")
+    print(f"loop lag backup: {summary(lag_busy)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--idle", type=float, default=5.0, help="секунд замера в покое")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "bench.db")
+        db.ARCHIVE_DB_PATH = os.path.join(tmp, "archive.db")
+        fill_db(db.DB_PATH, args.rows)
+        db.init_db()
+        backup.BACKUP_DIR = os.path.join(tmp, "backups")
+        asyncio.run(run(args.rows, args.idle))
+
+
+if __name__ == "__main__":
+    main()
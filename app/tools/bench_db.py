@@ -0,0 +1,130 @@
+"""
+Бенчмарк запросов админки и рекламы на большой БД до и после миграций.
+
+    python -m app.tools.bench_db --rows 1000000
+
+«До» — схема без индекса по created_at, журнал DELETE, synchronous=FULL, соединение на каждую операцию (как было).
+«После» — init_db(): миграции, WAL, synchronous=NORMAL, mmap; соединение потока из app/db.py
+переиспользуется между операциями.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable
+
+from app import db
+
+USERS_DDL = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    telegram_id INTEGER UNIQUE,
+    username TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    created_at TEXT,
+    promo_sent INTEGER DEFAULT 0,
+    score INTEGER DEFAULT 0
+);
+"""
+
+
+def fill_db(path: str, rows: int, batch: int = 50_000) -> None:
+    """Создаёт БД в старой схеме и заполняет её rows пользователями"""
+    conn = sqlite3.connect(path)
+    conn.execute(USERS_DDL)
+    start = datetime(2024, 1, 1)
+    rnd = random.Random(42)
+    for offset in range(0, rows, batch):
+        conn.executemany(
+            "INSERT INTO users (telegram_id, username, first_name, last_name, created_at, promo_sent, score) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    1_000_000 + i,
+                    f"user{i}" if i % 3 else None,
+                    f"Имя{i % 5000}",
+                    f"Фамилия{i % 7000}" if i % 2 else None,
+                    # created_at не монотонен по id, как и в жизни после переносов
+                    (start + timedelta(seconds=rnd.randrange(60 * 60 * 24 * 700))).isoformat(),
+                    rnd.random() < 0.5,
+                    rnd.randrange(7, 71),
+                )
+                for i in range(offset, min(rows, offset + batch))
+            ),
+        )
+        conn.commit()
+    conn.close()
+
+
+def run_queries(connect: Callable[[], sqlite3.Connection], rows: int, repeat: int) -> dict[str, list[float]]:
+    rnd = random.Random(7)
+    queries = {
+        "get_recent_users": lambda c, _: c.execute(
+            "SELECT telegram_id, username, first_name, last_name, created_at, score "
+            "FROM users ORDER BY created_at DESC LIMIT 10"
+        ).fetchall(),
+        "is_promo_sent": lambda c, tid: c.execute(
+            "SELECT promo_sent FROM users WHERE telegram_id = ?", (tid,)
+        ).fetchone(),
+        "get_user_first_name": lambda c, tid: c.execute(
+            "SELECT first_name FROM users WHERE telegram_id = ?", (tid,)
+        ).fetchone(),
+        "mark_promo_sent": lambda c, tid: c.execute(
+            "UPDATE users SET promo_sent = 1 WHERE telegram_id = ?", (tid,)
+        ),
+        "update_score": lambda c, tid: c.execute(
+            "UPDATE users SET score = ? WHERE telegram_id = ?", (rnd.randrange(7, 71), tid)
+        ),
+    }
+    timings: dict[str, list[float]] = {name: [] for name in queries}
+    for name, query in queries.items():
+        for _ in range(repeat):
+            telegram_id = 1_000_000 + rnd.randrange(rows)
+            started = time.perf_counter()
+            conn = connect()
+            query(conn, telegram_id)
+            conn.commit()
+            conn.close()
+            timings[name].append(time.perf_counter() - started)
+    return timings
+
+
+def print_report(before: dict[str, list[float]], after: dict[str, list[float]]) -> None:
+    print(f"{'query':<22}{'before p50, ms':>16}{'after p50, ms':>16}{'speedup':>10}")
+    for name in before:
+        b = statistics.median(before[name]) * 1000
+        a = statistics.median(after[name]) * 1000
+        print(f"{name:<22}{b:>16.3f}{a:>16.3f}{b / a:>9.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--dir", default=None, help="каталог для временной БД")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        path = os.path.join(tmp, "bench.db")
+        started = time.perf_counter()
+        fill_db(path, args.rows)
+        print(f"Filled {args.rows} rows in {time.perf_counter() - started:.1f}s")
+
+        before = run_queries(lambda: sqlite3.connect(path), args.rows, args.repeat)
+
+        db.DB_PATH = path
+        started = time.perf_counter()
+        db.init_db()
+        print(f"Migrations applied in {time.perf_counter() - started:.1f}s")
+
+        after = run_queries(db._connect, args.rows, args.repeat)
+        print_report(before, after)
+
+
+if __name__ == "__main__":
+    main()
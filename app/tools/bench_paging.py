@@ -0,0 +1,62 @@
+"""
+Сколько байт уходит в Bot API, пока пользователь дочитывает результат до конца.
+
+    python -m app.tools.bench_paging
+
+Для каждого уровня и режима листания (см. RESULT_PAGING_MODE в app/routers/test.py)
+собираются те же запросы, что отправляет бот: первая страница через sendMessage,
+остальные — через editMessageText (cumulative, replace) или
+editMessageReplyMarkup + sendMessage (append). Считается размер JSON-тела запросов.
+"""
+import json
+
+from aiogram.client.default import Default
+from aiogram.methods import EditMessageReplyMarkup, EditMessageText, SendMessage, TelegramMethod
+
+from app.keyboards.inline import build_result_kb_for_page
+from app.questions import interpret_score
+from app.routers.test import build_result_pages
+
+MODES = ("cumulative", "replace", "append")
+LEVELS = {"ЗЕЛЕНЫЙ": 10, "ЖЕЛТЫЙ": 25, "КРАСНЫЙ": 45, "МИГАЮЩИЙ КРАСНЫЙ": 60}
+
+
+def _size(method: TelegramMethod) -> int:
+    # Поля со значениями по умолчанию бота (Default) подставляются при отправке — не считаем
+    fields = {
+        key: value
+        for key, value in method.model_dump(exclude_none=True).items()
+        if not isinstance(value, Default)
+    }
+    return len(json.dumps(fields, ensure_ascii=False).encode("utf-8"))
+
+
+def bytes_per_full_read(text: str, mode: str) -> tuple[int, int]:
+    """Возвращает (количество запросов, байт всего) за полное прочтение результата"""
+    pages = build_result_pages(text, mode)
+    chat_id, message_id = 1, 1
+    requests = [SendMessage(chat_id=chat_id, text=pages[0], reply_markup=build_result_kb_for_page(0, len(pages)))]
+    for page in range(1, len(pages)):
+        kb = build_result_kb_for_page(page, len(pages))
+        if mode == "append":
+            requests.append(EditMessageReplyMarkup(chat_id=chat_id, message_id=message_id))
+            requests.append(SendMessage(chat_id=chat_id, text=pages[page], reply_markup=kb))
+            message_id += 1
+        else:
+            requests.append(EditMessageText(chat_id=chat_id, message_id=message_id, text=pages[page], reply_markup=kb))
+    return len(requests), sum(_size(r) for r in requests)
+
+
+def main() -> None:
+    print(f"{'level':<18}{'chars':>7}" + "".join(f"{mode:>22}" for mode in MODES))
+    for level, score in LEVELS.items():
+        text = interpret_score(score)
+        row = f"{level:<18}{len(text):>7}"
+        for mode in MODES:
+            count, size = bytes_per_full_read(text, mode)
+            row += f"{f'{count} req / {size} B':>22}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
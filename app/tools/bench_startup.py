@@ -0,0 +1,150 @@
+"""
+Время холодного старта: от запуска процесса `python -m app.main` до первого getUpdates.
+
+    python -m app.tools.bench_startup --runs 10
+    python -m app.tools.bench_startup --runs 10 --cold-bytecode --imports
+
+Бот запускается по-настоящему (все импорты, БД, прогрев, restore_state, start_polling),
+но с поддельной сессией Bot API из app/tools/replay.py (--api-latency — её задержка, как у сети
+до Telegram) и временной папкой данных; процесс завершается на первом getUpdates.
+--cold-bytecode: код бота копируется без __pycache__ и запускается с PYTHONDONTWRITEBYTECODE —
+как образ без `compileall`, где каждый запуск заново компилирует app/.
+--imports: самые долгие модули по собственному времени импорта (STARTUP_PROFILE=1), медиана по запускам.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run_child(api_latency: float) -> None:
+    """
+    Выполняется в дочернем процессе: app.main как есть, но с поддельной сессией Bot API.
+    Процесс завершается на первом getUpdates — это и есть момент готовности принимать апдейты.
+    """
+    # Первым — чтобы замер импорта (STARTUP_PROFILE) охватил aiogram
+    try:
+        from app.core.startup import startup
+    except ImportError:  # дерево до появления app/core/startup.py — для сравнения «до/после»
+        startup = None
+    import runpy
+
+    from app.core import http
+    from app.tools.replay import FakeSession
+
+    class BenchSession(FakeSession):
+        def __init__(self, *args, **kwargs) -> None:
+            super().__init__(latency=api_latency)
+            self.last_poll: dict = {}
+
+        def stats(self) -> dict:
+            return {"calls": dict(self.calls)}
+
+        async def make_request(self, bot, method, timeout=None):
+            if method.__api_method__ != "getUpdates":
+                return await super().make_request(bot, method, timeout)
+            result = {"get_updates": time.time(), "calls": dict(self.calls)}
+            if startup is not None:
+                startup.mark("first getUpdates")
+                result["phases"] = startup.phases
+                result["imports"] = {name: own for name, (own, _) in startup.imports.items()}
+            print("BENCH " + json.dumps(result), flush=True)
+            os._exit(0)
+
+    http.PooledAiohttpSession = BenchSession
+    runpy.run_module("app.main", run_name="__main__")
+
+
+def run_once(cwd: str, data_dir: str, cold: bool, imports: bool, api_latency: float = 0.0) -> dict:
+    env = dict(
+        os.environ,
+        BOT_TOKEN="123456:bench",
+        DB_PATH=os.path.join(data_dir, "bot.db"),
+        ARCHIVE_DB_PATH=os.path.join(data_dir, "archive.db"),
+        BACKUP_DIR=os.path.join(data_dir, "backups"),
+        STATE_PATH=os.path.join(data_dir, "state.json"),
+        TRACE_FILE=os.path.join(data_dir, "traces", "spans.jsonl"),
+        HEALTH_PORT="0",
+        PYTHONPATH=cwd,
+    )
+    env.pop("TENANTS_FILE", None)
+    if cold:
+        env["PYTHONDONTWRITEBYTECODE"] = "1"
+    if imports:
+        env["STARTUP_PROFILE"] = "1"
+
+    started = time.time()
+    proc = subprocess.run(
+        [sys.executable, "-m", "app.tools.bench_startup", "--child", "--api-latency", str(api_latency)],
+        cwd=cwd, env=env, capture_output=True, text=True, timeout=120,
+    )
+    for line in proc.stdout.splitlines():
+        if line.startswith("BENCH "):
+            result = json.loads(line[len("BENCH "):])
+            result["total"] = result["get_updates"] - started
+            return result
+    raise SystemExit(f"Bot did not reach getUpdates (exit code {proc.returncode}):\n{proc.stderr[-3000:]}")
+
+
+def copy_tree(target: str) -> str:
+    """Код бота без __pycache__ — как свежий COPY app в образе"""
+    shutil.copytree(os.path.join(ROOT, "app"), os.path.join(target, "app"), ignore=shutil.ignore_patterns("__pycache__"))
+    return target
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--cold-bytecode", action="store_true", help="без скомпилированного байткода app/")
+    parser.add_argument("--imports", action="store_true", help="время импорта по модулям")
+    parser.add_argument("--api-latency", type=float, default=0.1, help="задержка ответа Bot API, сек")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.api_latency)
+        return
+
+    totals: list[float] = []
+    phases: dict[str, list[float]] = defaultdict(list)
+    imports: dict[str, list[float]] = defaultdict(list)
+    with tempfile.TemporaryDirectory() as tmp:
+        if not args.cold_bytecode:
+            # Прогон, который пишет байткод; в замер не идёт
+            run_once(ROOT, tempfile.mkdtemp(dir=tmp), cold=False, imports=False)
+        for _ in range(args.runs):
+            cwd = copy_tree(tempfile.mkdtemp(dir=tmp)) if args.cold_bytecode else ROOT
+            result = run_once(cwd, tempfile.mkdtemp(dir=tmp), args.cold_bytecode, args.imports, args.api_latency)
+            totals.append(result["total"])
+            calls = result["calls"]
+            for phase, elapsed in result.get("phases", []):
+                phases[phase].append(elapsed)
+            for name, own in result.get("imports", {}).items():
+                imports[name].append(own)
+
+    print(f"Process start -> first getUpdates ({args.runs} runs, "
+          f"{'cold' if args.cold_bytecode else 'precompiled'} bytecode, Bot API latency {args.api_latency * 1000:.0f} ms):")
+    print(f"  median {statistics.median(totals):.3f}s  min {min(totals):.3f}s  max {max(totals):.3f}s")
+    print(f"  Bot API calls before polling: {calls}")
+    if phases:
+        print("\nPhases (median, seconds from process start):")
+        for phase, values in phases.items():
+            print(f"  {statistics.median(values):8.3f}s  {phase}")
+    if imports:
+        medians = sorted(((statistics.median(v), name) for name, v in imports.items()), reverse=True)
+        print(f"\nImports: {len(imports)} modules, {sum(m for m, _ in medians):.3f}s own time; slowest:")
+        for own, name in medians[:args.top]:
+            print(f"  {own * 1000:8.1f}ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+Воспроизведение записанного трафика (см. RECORD_UPDATES_DIR) через настоящий Dispatcher
+со всеми роутерами — на поддельном боте и временной БД.
+
+    python -m app.tools.replay /data/recordings/updates-*.jsonl.gz --speed 10
+    python -m app.tools.replay rec.jsonl.gz --speed max --out release.json --baseline last.json
+
+--speed: 1 — в реальном времени, N — в N раз быстрее, max — без пауз между апдейтами.
+Отчёт: перцентили времени обработки апдейтов по видам, число записей в БД
+и вызовов Bot API. С --baseline выводится сравнение с прошлым отчётом.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Any, Optional
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import Chat, Message, Update, User
+
+from app import db
+from app.core.recorder import read_recording
+
+FAKE_TOKEN = "123456:replay"
+
+
+class FakeSession(BaseSession):
+    """Сессия Bot API без сети: отвечает правдоподобными объектами с заданной задержкой"""
+
+    def __init__(self, latency: float = 0.0) -> None:
+        super().__init__()
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self._message_id = 0
+
+    async def make_request(
+        self, bot: Bot, method: TelegramMethod[TelegramType], timeout: Optional[int] = None
+    ) -> TelegramType:
+        self.calls[method.__api_method__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        returning = str(method.__returning__)
+        if "Message" in returning:
+            self._message_id += 1
+            chat_id = getattr(method, "chat_id", None)
+            return Message(
+                message_id=self._message_id,
+                date=datetime.datetime.now(),
+                chat=Chat(id=chat_id if isinstance(chat_id, int) else 0, type="private"),
+                text=getattr(method, "text", None),
+            )
+        if method.__returning__ is User:
+            return User(id=bot.id, is_bot=True, first_name="Replay", username="replay_bot")
+        return True
+
+    async def close(self) -> None:
+        pass
+
+    async def stream_content(self, *args: Any, **kwargs: Any):  # pragma: no cover
+        raise NotImplementedError
+        yield b""
+
+
+class DbWriteCounter:
+    """Считает пишущие запросы ко всем соединениям из app.db._connect()"""
+
+    def __init__(self) -> None:
+        self.writes: Counter = Counter()
+        self._connect = db._connect
+
+    def install(self) -> None:
+        def connect() -> sqlite3.Connection:
+            conn = self._connect()
+            conn.set_trace_callback(self._trace)
+            return conn
+
+        db._connect = connect
+
+    def _trace(self, statement: str) -> None:
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+        if verb in ("INSERT", "UPDATE", "DELETE", "REPLACE"):
+            self.writes[verb] += 1
+
+
+def update_kind(update: Update) -> str:
+    """Вид апдейта для отчёта: команда/текст сообщения или префикс callback_data"""
+    if update.message:
+        text = update.message.text or ""
+        return f"message:{text.split()[0]}" if text.startswith("/") else f"message:{text[:20]}"
+    if update.callback_query:
+        return f"callback:{(update.callback_query.data or '').split(':')[0]}"
+    return update.event_type
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    values = sorted(values)
+
+    def pick(p: float) -> float:
+        return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+    return {
+        "count": len(values),
+        "p50_ms": pick(0.5),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": values[-1] * 1000,
+        "mean_ms": statistics.fmean(values) * 1000,
+    }
+
+
+async def replay(paths: list[str], speed: Optional[float], api_latency: float) -> dict:
+    # Импорт здесь: роутеры читают настройки окружения при импорте
+    from app.main import build_dispatcher
+
+    bot = Bot(FAKE_TOKEN, session=FakeSession(api_latency))
+    dp = build_dispatcher()
+    latencies: dict[str, list[float]] = defaultdict(list)
+    errors: Counter = Counter()
+
+    async def process(update: Update) -> None:
+        kind = update_kind(update)
+        started = time.perf_counter()
+        try:
+            await dp.feed_update(bot, update)
+        except Exception:
+            errors[kind] += 1
+        latencies[kind].append(time.perf_counter() - started)
+
+    records = list(read_recording(paths))
+    if not records:
+        raise SystemExit("Recording is empty")
+
+    tasks = []
+    first_ts = records[0][0]
+    started = time.perf_counter()
+    for ts, payload in records:
+        if speed is not None:
+            delay = (ts - first_ts) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        update = Update.model_validate(payload, context={"bot": bot})
+        tasks.append(asyncio.create_task(process(update)))
+    await asyncio.gather(*tasks)
+    wall = time.perf_counter() - started
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        "updates": len(records),
+        "wall_seconds": wall,
+        "speed": "max" if speed is None else speed,
+        "overall": percentiles(all_latencies),
+        "by_kind": {kind: percentiles(values) for kind, values in sorted(latencies.items())},
+        "errors": dict(errors),
+        "api_calls": dict(bot.session.calls),
+    }
+
+
+def print_report(report: dict, baseline: Optional[dict] = None) -> None:
+    print(f"Replayed {report['updates']} updates in {report['wall_seconds']:.1f}s (speed {report['speed']})")
+    print(f"{'kind':<30}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'Δp95':>10}")
+    rows = [("ALL", report["overall"])] + list(report["by_kind"].items())
+    for kind, stats in rows:
+        delta = ""
+        if baseline:
+            base = baseline["overall"] if kind == "ALL" else baseline["by_kind"].get(kind)
+            if base and base["p95_ms"]:
+                delta = f"{(stats['p95_ms'] / base['p95_ms'] - 1) * 100:+.0f}%"
+        print(
+            f"{kind:<30}{stats['count']:>7}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+            f"{stats['p99_ms']:>10.2f}{stats['max_ms']:>10.2f}{delta:>10}"
+        )
+    print(f"DB writes: {report['db_writes']}")
+    print(f"Bot API calls: {report['api_calls']}")
+    if report["errors"]:
+        print(f"Errors: {report['errors']}")
+    if baseline:
+        print(f"Baseline DB writes: {baseline.get('db_writes')}, Bot API calls: {baseline.get('api_calls')}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recordings", nargs="+", help="файлы updates-*.jsonl.gz")
+    parser.add_argument("--speed", default="1", help="1, 10, ... или max")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="задержка ответа Bot API, мс")
+    parser.add_argument("--out", help="сохранить отчёт в JSON")
+    parser.add_argument("--baseline", help="JSON-отчёт прошлого релиза для сравнения")
+    args = parser.parse_args()
+
+    speed = None if args.speed == "max" else float(args.speed)
+    # Строка лога на каждый апдейт только мешает читать отчёт
+    logging.getLogger("aiogram.event").setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "replay.db")
+        db.ARCHIVE_DB_PATH = os.path.join(tmp, "archive.db")
+        # Остальные файлы бота — тоже во временной папке, как в bench_startup: повтор не должен
+        # трогать данные бота на той же машине. Модули с этими настройками (кроме трассировки,
+        # которую replay не запускает) импортируются вместе с app.main в replay()
+        os.environ.update(
+            STATE_PATH=os.path.join(tmp, "state.json"),
+            TRACE_FILE=os.path.join(tmp, "traces", "spans.jsonl"),
+            BACKUP_DIR=os.path.join(tmp, "backups"),
+        )
+        db.init_db()
+        counter = DbWriteCounter()
+        counter.install()
+
+        report = asyncio.run(replay(args.recordings, speed, args.api_latency / 1000))
+        report["db_writes"] = dict(counter.writes)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import os
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramUnauthorizedError
+from aiogram.types import FSInputFile
+
+from app.core.tenants import TENANTS, Tenant, use_tenant
+from app.db import open_connection, warm_up as warm_up_db
+from app.keyboards.inline import build_menu_inline, build_result_kb_for_page
+from app.keyboards.reply import get_main_keyboard
+from app.questions import QUESTIONS, get_result_image_name
+from app.routers.test import RESULT_PHOTOS, result_image_path, result_pages
+
+logger = logging.getLogger(__name__)
+
+# Чат, куда при старте загружаются картинки результата, у которых ещё нет file_id
+# (сообщение сразу удаляется). 0 — не загружать заранее, file_id появится при первой отправке
+WARMUP_PHOTO_CHAT = int(os.getenv("WARMUP_PHOTO_CHAT", "0"))
+# Сколько раз пробовать getMe при сетевых ошибках
+WARMUP_GETME_ATTEMPTS = int(os.getenv("WARMUP_GETME_ATTEMPTS", "3"))
+
+MIN_SCORE = sum(min(o.points for o in q.options) for q in QUESTIONS)
+MAX_SCORE = sum(max(o.points for o in q.options) for q in QUESTIONS)
+
+
+def warm_content() -> int:
+    """Нарезка текстов результата и неизменяемые клавиатуры — в кэш, до первого пользователя"""
+    pages = 0
+    for score in range(MIN_SCORE, MAX_SCORE + 1):
+        total = len(result_pages(score))
+        pages += total
+        for page in range(total):
+            build_result_kb_for_page(page, total)
+    build_menu_inline(False)
+    build_menu_inline(True)
+    get_main_keyboard()
+    return pages
+
+
+async def check_bot(bot: Bot, attempts: int = WARMUP_GETME_ATTEMPTS) -> str:
+    """
+    getMe: токен рабочий и Bot API доступен. Заодно открывает соединение в пуле.
+    Ответ кэшируется в bot.me(), поэтому start_polling не ждёт ещё один getMe перед первым getUpdates.
+    Неверный токен — ошибка запуска; сетевые ошибки не мешают стартовать (polling сам повторит).
+    """
+    error = "not checked"
+    for attempt in range(attempts):
+        try:
+            me = await bot.me()
+            return f"ok @{me.username}"
+        except TelegramUnauthorizedError:
+            raise
+        except TelegramAPIError as e:
+            logger.warning("getMe failed (%s), attempt %d/%d", e, attempt + 1, attempts)
+            if attempt + 1 < attempts:
+                await asyncio.sleep(2 ** attempt)
+            error = f"{type(e).__name__}: {e}"
+    return error
+
+
+async def upload_result_photos(bot: Bot, chat_id: int) -> int:
+    """Загружает картинки результата без file_id: отправка в служебный чат и удаление сообщения"""
+    uploaded = 0
+    for image_name in sorted({get_result_image_name(score) for score in range(MIN_SCORE, MAX_SCORE + 1)}):
+        if RESULT_PHOTOS.get(image_name):
+            continue
+        message = await bot.send_photo(chat_id, FSInputFile(result_image_path(image_name)), disable_notification=True)
+        if message.photo:
+            RESULT_PHOTOS[image_name] = message.photo[-1].file_id
+            uploaded += 1
+        try:
+            await bot.delete_message(chat_id, message.message_id)
+        except TelegramAPIError:
+            pass
+    return uploaded
+
+
+async def warm_bot(name: str, bot: Bot, tenant: Optional[Tenant]) -> dict[str, str]:
+    """
+    Прогрев одного бота: БД читается в потоке, пока идёт getMe; затем открывается соединение
+    потока цикла событий — его и используют обработчики (соединения кэшируются по потокам)
+    """
+    checks = {}
+    with use_tenant(tenant):
+        db_task = asyncio.create_task(asyncio.to_thread(warm_up_db))
+        checks[f"{name}.getMe"] = await check_bot(bot)
+        try:
+            users = await db_task
+            open_connection()
+            checks[f"{name}.db"] = f"ok, {users} users"
+        except Exception as e:
+            logger.exception("DB warm-up failed for %s", name)
+            checks[f"{name}.db"] = f"{type(e).__name__}: {e}"
+
+        cached = len(RESULT_PHOTOS)
+        if WARMUP_PHOTO_CHAT:
+            try:
+                uploaded = await upload_result_photos(bot, WARMUP_PHOTO_CHAT)
+                checks[f"{name}.photos"] = f"ok, {cached} cached, {uploaded} uploaded"
+            except TelegramAPIError as e:
+                logger.warning("Result photos upload failed for %s: %s", name, e)
+                checks[f"{name}.photos"] = f"{type(e).__name__}: {e}"
+        else:
+            checks[f"{name}.photos"] = f"ok, {cached} cached"
+    return checks
+
+
+async def warm_up(bots: dict[str, Bot]) -> dict[str, str]:
+    """
+    Прогрев перед start_polling: кэши текстов и клавиатур, затем все боты одновременно —
+    БД, getMe, file_id картинок результата. Возвращает результат каждого шага для /health.
+    """
+    checks = {"content": f"ok, {warm_content()} result pages"}
+    by_name = {tenant.name: tenant for tenant in TENANTS}
+    for bot_checks in await asyncio.gather(*(warm_bot(name, bot, by_name.get(name)) for name, bot in bots.items())):
+        checks.update(bot_checks)
+    return checks